@@ -0,0 +1,263 @@
+#!/usr/bin/python3
+
+"""
+Benchmarks for dependency resolution and task queue processing.
+
+Synthetic projects are generated in several shapes and sizes, then each hot
+path (resolving, building a queue, draining it, and cascading a failure) is
+timed and its peak memory use is recorded.  Results can be saved and compared
+against an earlier run to catch regressions between commits:
+
+    $ python3 bench/bench_resolve.py --json before.json
+    $ python3 bench/bench_resolve.py --compare before.json
+"""
+
+import argparse
+import gc
+import json
+import os.path
+import random
+import sys
+import time
+import tracemalloc
+
+import devpipeline_core.resolve
+import devpipeline_core.taskqueue
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "test", "common"))
+
+import mockconfig
+
+_TASKS = ["checkout", "build", "test", "install"]
+
+
+def _name(index):
+    return "c{}".format(index)
+
+
+def _chain(size, rng):
+    del rng
+    return [[index - 1] if index else [] for index in range(size)]
+
+
+def _fan(size, rng):
+    # a single root, a wide layer that depends on it, and a single sink that
+    # depends on the entire wide layer
+    del rng
+    middle = list(range(1, size - 1))
+    return [[]] + [[0] for _ in middle] + [middle]
+
+
+def _random_dag(size, rng):
+    return [rng.sample(range(index), min(index, 3)) for index in range(size)]
+
+
+def _lattice(size, rng):
+    del rng
+    width = max(1, int(size ** 0.5))
+    dependencies = []
+    for index in range(size):
+        row, column = divmod(index, width)
+        component_dependencies = []
+        if row:
+            component_dependencies.append(index - width)
+        if column:
+            component_dependencies.append(index - 1)
+        dependencies.append(component_dependencies)
+    return dependencies
+
+
+_TOPOLOGIES = {
+    "chain": _chain,
+    "fan": _fan,
+    "lattice": _lattice,
+    "random": _random_dag,
+}
+
+_GRAPHS = {
+    "compact": devpipeline_core.taskqueue.CompactDependencyManager,
+    "standard": devpipeline_core.taskqueue.DependencyManager,
+}
+
+
+class _Project:
+    def __init__(self, dependencies):
+        config = {}
+        has_dependents = set()
+        for index, component_dependencies in enumerate(dependencies):
+            component = {}
+            if component_dependencies:
+                component["depends.build"] = ", ".join(
+                    _name(dependency) for dependency in component_dependencies
+                )
+                has_dependents.update(component_dependencies)
+            config[_name(index)] = component
+        self.config = mockconfig.MockConfig(config)
+        self.roots = [
+            _name(index)
+            for index, component_dependencies in enumerate(dependencies)
+            if not component_dependencies
+        ]
+        self.sinks = [
+            _name(index)
+            for index in range(len(dependencies))
+            if index not in has_dependents
+        ]
+
+
+def _drain(task_queue):
+    task = task_queue.pop_ready()
+    while task is not None:
+        task_queue.resolve(task)
+        task = task_queue.pop_ready()
+
+
+def _fail_roots(project, task_queue):
+    for root in project.roots:
+        task_queue.fail((root, _TASKS[0]))
+
+
+def _make_phases(project, manager_type):
+    def _resolve():
+        return devpipeline_core.resolve.calculate_dependencies(
+            project.sinks, project.config, _TASKS, manager_type
+        )
+
+    dep_manager = _resolve()
+    return [
+        ("resolve", lambda: None, lambda state: _resolve()),
+        (
+            "reverse",
+            lambda: None,
+            lambda state: devpipeline_core.resolve._process_reverse(
+                project.roots, project.config, _TASKS, manager_type
+            ),
+        ),
+        ("queue", lambda: None, lambda state: dep_manager.get_queue()),
+        ("drain", dep_manager.get_queue, _drain),
+        (
+            "fail",
+            dep_manager.get_queue,
+            lambda task_queue: _fail_roots(project, task_queue),
+        ),
+    ]
+
+
+def _measure(setup_fn, run_fn, repeat):
+    best = None
+    for _ in range(repeat):
+        state = setup_fn()
+        gc.collect()
+        start = time.perf_counter()
+        run_fn(state)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    # tracing slows everything down, so memory gets a separate run
+    state = setup_fn()
+    gc.collect()
+    tracemalloc.start()
+    run_fn(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (best, peak)
+
+
+def _run_benchmarks(arguments):
+    results = []
+    for topology in arguments.topologies:
+        for size in arguments.sizes:
+            dependencies = _TOPOLOGIES[topology](size, random.Random(arguments.seed))
+            project = _Project(dependencies)
+            for graph in arguments.graphs:
+                for phase, setup_fn, run_fn in _make_phases(project, _GRAPHS[graph]):
+                    seconds, peak = _measure(setup_fn, run_fn, arguments.repeat)
+                    result = {
+                        "topology": topology,
+                        "size": size,
+                        "graph": graph,
+                        "phase": phase,
+                        "seconds": seconds,
+                        "peak_bytes": peak,
+                    }
+                    _print_result(result, arguments.baseline)
+                    results.append(result)
+    return results
+
+
+def _result_key(result):
+    return (result["topology"], result["size"], result["graph"], result["phase"])
+
+
+def _print_result(result, baseline):
+    line = "{:8} {:>7} {:8} {:8} {:>10.4f}s {:>10.1f}KiB".format(
+        result["topology"],
+        result["size"],
+        result["graph"],
+        result["phase"],
+        result["seconds"],
+        result["peak_bytes"] / 1024,
+    )
+    previous = baseline.get(_result_key(result))
+    if previous:
+        line += "  time x{:.2f}  memory x{:.2f}".format(
+            result["seconds"] / max(previous["seconds"], 1e-9),
+            result["peak_bytes"] / max(previous["peak_bytes"], 1),
+        )
+    print(line)
+    sys.stdout.flush()
+
+
+def _load_baseline(path):
+    if not path:
+        return {}
+    with open(path) as baseline_file:
+        return {_result_key(result): result for result in json.load(baseline_file)}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=[100, 1000, 10000],
+        help="The number of components in each generated project.",
+    )
+    parser.add_argument(
+        "--topologies",
+        nargs="+",
+        choices=sorted(_TOPOLOGIES),
+        default=sorted(_TOPOLOGIES),
+        help="The shapes of generated projects.",
+    )
+    parser.add_argument(
+        "--graphs",
+        nargs="+",
+        choices=sorted(_GRAPHS),
+        default=sorted(_GRAPHS),
+        help="The dependency graph implementations to measure.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Report the best time of this many runs.",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed for randomly generated projects."
+    )
+    parser.add_argument("--json", help="Save results to a file.")
+    parser.add_argument(
+        "--compare", help="Compare results against a file saved with --json."
+    )
+    arguments = parser.parse_args(args)
+    arguments.baseline = _load_baseline(arguments.compare)
+
+    results = _run_benchmarks(arguments)
+    if arguments.json:
+        with open(arguments.json, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
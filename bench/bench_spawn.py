@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+
+"""
+Benchmarks for the cost of running a command through an executor.
+
+Each command is a trivial program, so the time measured is almost entirely
+the cost of starting and reaping a process.  Spawning with posix_spawn is
+compared against subprocess, optionally with a large heap allocated first to
+show how fork's cost grows with the size of the parent process:
+
+    $ python3 bench/bench_spawn.py --heap-mb 0 512
+"""
+
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+
+import devpipeline_core.executor
+
+_METHODS = {
+    "posix_spawn": True,
+    "subprocess": False,
+}
+
+
+def _time_commands(executor, command, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        executor.execute(None, dict(command))
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _run_benchmarks(arguments):
+    executor = devpipeline_core.executor.QuietExecutor()
+    with open(os.devnull, "w") as output:
+        command = {"args": arguments.command, "stdout": output}
+        for heap_mb in arguments.heap_mb:
+            # touch every page so it has to be mapped into the child
+            heap = bytearray(heap_mb * 1024 * 1024)
+            for offset in range(0, len(heap), 4096):
+                heap[offset] = 1
+            gc.collect()
+            for method in arguments.methods:
+                devpipeline_core.executor._USE_POSIX_SPAWN = _METHODS[method]
+                latencies = _time_commands(executor, command, arguments.count)
+                print(
+                    "{:>6}MiB {:12} mean {:>8.3f}ms  median {:>8.3f}ms".format(
+                        heap_mb,
+                        method,
+                        statistics.mean(latencies) * 1000,
+                        statistics.median(latencies) * 1000,
+                    )
+                )
+                sys.stdout.flush()
+            del heap
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--count", type=int, default=200, help="The number of commands to run."
+    )
+    parser.add_argument(
+        "--heap-mb",
+        nargs="+",
+        type=int,
+        default=[0, 256],
+        help="The size of the heap to allocate before spawning.",
+    )
+    parser.add_argument(
+        "--methods",
+        nargs="+",
+        choices=sorted(_METHODS),
+        default=sorted(_METHODS),
+        help="The ways to start commands.",
+    )
+    parser.add_argument(
+        "--command",
+        nargs="+",
+        default=["true"],
+        help="The command to run.",
+    )
+    arguments = parser.parse_args(args)
+    if not devpipeline_core.executor._USE_POSIX_SPAWN:
+        arguments.methods = ["subprocess"]
+    _run_benchmarks(arguments)
+
+
+if __name__ == "__main__":
+    main()
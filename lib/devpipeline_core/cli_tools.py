@@ -1,7 +1,12 @@
 #!/usr/bin/python3
 
+import datetime
+import time
+
 import devpipeline_core
 import devpipeline_core.command
+import devpipeline_core.history
+import devpipeline_core.plugin
 import devpipeline_core.version
 
 
@@ -28,6 +33,129 @@ def _print_executors(arguments):
         print("{} - {}".format(executor, devpipeline_core.EXECUTOR_TYPES[executor][1]))
 
 
+def _configure_plugins(parser):
+    _configure(parser)
+    parser.add_argument(
+        "--timing",
+        action="store_true",
+        default=False,
+        help="Load every plugin and report how long discovery and each import took.",
+    )
+
+
+def _time_plugin(plugins, name):
+    start = time.perf_counter()
+    try:
+        plugins[name]  # pylint: disable=pointless-statement
+    except Exception as failure:  # pylint: disable=broad-except
+        return (time.perf_counter() - start, "failed: {}".format(failure))
+    return (time.perf_counter() - start, None)
+
+
+def _print_plugins(arguments):
+    groups = devpipeline_core.plugin.query_groups("devpipeline.")
+    if arguments.timing:
+        discovery_time, from_cache = devpipeline_core.plugin.get_discovery_info()
+        print(
+            "Entry point discovery: {:.4f}s ({})".format(
+                discovery_time, "cached" if from_cache else "scanned"
+            )
+        )
+
+    for group in groups:
+        plugins = devpipeline_core.plugin.query_plugins(group)
+        print(group)
+        if arguments.timing:
+            timings = [(name, _time_plugin(plugins, name)) for name in plugins]
+            for name, (elapsed, error) in sorted(
+                timings, key=lambda timing: timing[1][0], reverse=True
+            ):
+                print("\t{:.4f}s {} ({})".format(elapsed, name, error or "loaded"))
+        else:
+            for name in sorted(plugins):
+                print("\t{} = {}".format(name, plugins.get_target(name)))
+
+
+def _configure_history(parser):
+    _configure(parser)
+    parser.add_argument(
+        "history", help="The build history database (build-history.sqlite)."
+    )
+    modes = parser.add_mutually_exclusive_group()
+    modes.add_argument(
+        "--trend",
+        metavar="COMPONENT:TASK",
+        help="Show how long a task took in each recent run.",
+    )
+    modes.add_argument(
+        "--slower",
+        action="store_true",
+        default=False,
+        help="Show tasks that took longer in the latest run than on average.",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=10, help="The number of recent runs to consider."
+    )
+    parser.add_argument(
+        "--limit", type=int, default=10, help="The number of slowest tasks to show."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="How many times slower than average a task must be to be reported "
+        "by --slower.",
+    )
+
+
+def _format_task(component_task):
+    return "{} ({})".format(*component_task)
+
+
+def _print_trend(history, arguments):
+    component, _, task = arguments.trend.partition(":")
+    for started, duration, outcome in history.get_trend(
+        component, task, arguments.runs
+    ):
+        timestamp = datetime.datetime.fromtimestamp(started).isoformat(" ", "seconds")
+        if duration is None:
+            print("{}\t-\t{}".format(timestamp, outcome))
+        else:
+            print("{}\t{:.2f}s\t{}".format(timestamp, duration, outcome))
+
+
+def _print_slower(history, arguments):
+    for component_task, latest, average in history.get_slower(
+        arguments.runs, arguments.threshold
+    ):
+        print(
+            "{} - {:.2f}s (average {:.2f}s, x{:.2f})".format(
+                _format_task(component_task),
+                latest,
+                average,
+                latest / max(average, 1e-9),
+            )
+        )
+
+
+def _print_slowest(history, arguments):
+    for component_task, average in history.get_slowest(arguments.runs, arguments.limit):
+        print("{} - {:.2f}s".format(_format_task(component_task), average))
+
+
+def _print_history(arguments):
+    history = devpipeline_core.history.BuildHistory(arguments.history)
+    try:
+        if arguments.trend:
+            _print_trend(history, arguments)
+        elif arguments.slower:
+            _print_slower(history, arguments)
+        else:
+            _print_slowest(history, arguments)
+    finally:
+        history.close()
+
+
 _RESOLVERS_COMMAND = (
     "List the available resolvers.",
     _configure,
@@ -40,3 +168,17 @@ _EXECUTORS_COMMAND = (
     _configure,
     _print_executors,
 )
+
+
+_PLUGINS_COMMAND = (
+    "List installed plugins and how long they take to load.",
+    _configure_plugins,
+    _print_plugins,
+)
+
+
+_HISTORY_COMMAND = (
+    "Query the history of task durations.",
+    _configure_history,
+    _print_history,
+)
@@ -5,10 +5,25 @@ Classes and functions releated to executing commands.
 """
 
 import argparse
+import concurrent.futures
+import contextvars
+import math
+import os
+import threading
+import time
 
 import devpipeline_core.configinfo
 import devpipeline_core.env
+import devpipeline_core.fingerprint
+import devpipeline_core.graphcache
+import devpipeline_core.history
+import devpipeline_core.jobserver
+import devpipeline_core.resources
 import devpipeline_core.resolve
+import devpipeline_core.statefile
+import devpipeline_core.taskqueue
+import devpipeline_core.trace
+import devpipeline_core.usage
 import devpipeline_core.version
 
 
@@ -36,6 +51,69 @@ def setup_task_parser(parser):
         action="store_true",
         help="If a task fails, continue executing as many remaining tasks as possible.",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip tasks whose configuration, environment, and dependencies are "
+        "unchanged since they last succeeded.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        help="The maximum number of tasks to execute concurrently.  Defaults to 1, "
+        "or to as many as fit in --cpu-budget and --memory-budget if either is "
+        "used.",
+    )
+    parser.add_argument(
+        "--task-jobs",
+        nargs="+",
+        metavar="TASK=JOBS",
+        help="Give tasks their own limits on concurrency (e.g., checkout=32 "
+        "build=4).  Other tasks share --jobs.",
+    )
+    parser.add_argument(
+        "--jobserver",
+        action="store_true",
+        help="Share --jobs with nested builds through a GNU make jobserver, "
+        "joining the jobserver dev-pipeline was started with if there is one.",
+    )
+    parser.add_argument(
+        "--cpu-budget",
+        type=float,
+        help="Only start tasks while the CPUs they declare (resources.<task>.cpu) "
+        "fit in this many.  Defaults to the number of CPUs if --memory-budget "
+        "is used.",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        help="Only start tasks while the memory they declare "
+        "(resources.<task>.memory) fits in this much (e.g., 32G).  Defaults to "
+        "the machine's memory if --cpu-budget is used.",
+    )
+    parser.add_argument(
+        "--schedule",
+        choices=sorted(_SCHEDULES),
+        help="Control which ready task is started first.",
+        default="fifo",
+    )
+    parser.add_argument(
+        "--trace",
+        help="Save a timeline of every task and command to a file, in Chrome's "
+        "trace event format.",
+    )
+    parser.add_argument(
+        "--resource-usage",
+        action="store_true",
+        help="Print the CPU time, memory, and I/O used by each task's commands "
+        "once all tasks finish.",
+    )
+    parser.add_argument(
+        "--graph",
+        choices=sorted(_GRAPH_TYPES),
+        help="Control how the dependency graph is stored.  A compact graph "
+        "uses less memory for very large projects.",
+        default="standard",
+    )
 
 
 def add_version_info(argparser, version):
@@ -58,29 +136,334 @@ def process_targets(arguments, work_fn, config_fn):
     work_fn(targets, full_config)
 
 
-def _execute_targets(task_dict, task_queue, config_info, full_config, fail_function):
-    for component_tasks in task_queue:
-        for component_task in component_tasks:
-            task_heading = "  {} ({})".format(component_task[0], component_task[1])
-            config_info.executor.message(task_heading)
-            config_info.executor.message("-" * (2 + len(task_heading)))
+def _print_heading(executor, component_task):
+    task_heading = "  {} ({})".format(component_task[0], component_task[1])
+    executor.message(task_heading)
+    executor.message("-" * (2 + len(task_heading)))
 
-            config_info.config = full_config.get(component_task[0])
-            config_info.env = devpipeline_core.env.create_environment(
-                config_info.config
-            )
+
+def _finish_task(config_info, failed):
+    # executors that handle each task separately need to know when it's done
+    finish_fn = getattr(config_info.executor, "finish_task", None)
+    if finish_fn is not None:
+        finish_fn(failed)
+
+
+def _run_task(task_fn, executor, component_task, config_info_fn):
+    _print_heading(executor, component_task)
+    start = time.monotonic()
+    try:
+        with devpipeline_core.trace.task(component_task):
+            config_info = config_info_fn(component_task)
+            failed = True
             try:
-                task_dict[component_task[1]](config_info)
+                task_fn(config_info)
+                failed = False
+            finally:
+                _finish_task(config_info, failed)
+    finally:
+        executor.message("")
+    return time.monotonic() - start
+
+
+class _SerialPool:
+    """
+    A stand-in for ThreadPoolExecutor that runs each task immediately on the
+    calling thread.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, task_fn, *args):
+        # pylint: disable=no-self-use,broad-except
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(task_fn(*args))
+        except Exception as failure:
+            future.set_exception(failure)
+        return future
+
+
+async def _run_task_async(task_fn, executor, component_task, config_info_fn):
+    # pylint: disable=import-outside-toplevel
+    # asyncio is slow to import and only the async executor needs it
+    import asyncio
+
+    _print_heading(executor, component_task)
+    start = time.monotonic()
+    try:
+        with devpipeline_core.trace.task(component_task):
+            config_info = config_info_fn(component_task)
+            failed = True
+            try:
+                if asyncio.iscoroutinefunction(task_fn):
+                    await task_fn(config_info)
+                else:
+                    # tasks that can't be awaited still need a thread, which
+                    # should still know which task it's running
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, contextvars.copy_context().run, task_fn, config_info
+                    )
+                failed = False
+            finally:
+                _finish_task(config_info, failed)
+    finally:
+        executor.message("")
+    return time.monotonic() - start
+
+
+class _AsyncPool:
+    """
+    A stand-in for ThreadPoolExecutor that runs every task on a single event
+    loop, so tasks that await their commands don't each need a thread.  Task
+    functions that aren't coroutines still get a thread each, up to jobs, and
+    their calls to the executor's execute are run on the loop.
+    """
+
+    run_task = staticmethod(_run_task_async)
+
+    def __init__(self, jobs, executor):
+        # pylint: disable=import-outside-toplevel
+        import asyncio
+
+        self._asyncio = asyncio
+        self._executor = executor
+        self._loop = asyncio.new_event_loop()
+        # the default executor is too small to run --jobs synchronous tasks
+        self._loop.set_default_executor(
+            concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+        )
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        self._executor.loop = self._loop
+        return self
+
+    def __exit__(self, *exc_info):
+        self._executor.loop = None
+        self._asyncio.run_coroutine_threadsafe(
+            self._loop.shutdown_default_executor(), self._loop
+        ).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        return False
+
+    def submit(self, task_fn, *args):
+        return self._asyncio.run_coroutine_threadsafe(task_fn(*args), self._loop)
+
+
+def _make_pool(jobs, executor):
+    if getattr(executor, "asynchronous", False):
+        return _AsyncPool(jobs, executor)
+    if jobs > 1:
+        return concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+    return _SerialPool()
+
+
+# How often to retry starting tasks while a gate that can open on its own (e.g.,
+# a jobserver waiting for nested builds to return tokens) is holding them back.
+_GATE_POLL_INTERVAL = 0.1
+
+
+def _release_gates(gates, component_task):
+    for gate in gates:
+        gate.release(component_task)
+
+
+class _TaskPools:
+    """
+    A gate that gives some tasks their own limit on how many can run at once.
+    Every other task shares a default limit.
+    """
+
+    def __init__(self, limits, default_limit):
+        self._limits = dict(limits)
+        self._limits[None] = default_limit
+        self._running = {pool: 0 for pool in self._limits}
+        self.total = sum(self._limits.values())
+
+    def _get_pool(self, task_name):
+        if task_name in self._limits:
+            return task_name
+        return None
+
+    def is_open(self, task_name):
+        pool = self._get_pool(task_name)
+        return self._running[pool] < self._limits[pool]
+
+    def acquire(self, component_task):
+        if self.is_open(component_task[1]):
+            self._running[self._get_pool(component_task[1])] += 1
+            return True
+        return False
+
+    def release(self, component_task):
+        self._running[self._get_pool(component_task[1])] -= 1
+
+
+def _execute_targets(
+    task_dict,
+    task_queue,
+    executor,
+    config_info_fn,
+    up_to_date_function,
+    success_function,
+    fail_function,
+    jobs,
+    gates=(),
+):
+    """
+    Run every task in a queue.
+
+    Gates limit which ready tasks can start.  Each gate has acquire, which
+    takes a (component, task) and returns whether the task can start (taking
+    whatever the task needs if so), and release, which is called once a task
+    that was let through finishes.  A gate must let a task through when
+    nothing else is running.
+
+    Gates that only care about task names can also provide is_open, which
+    takes a task name, so ready tasks with closed names are never looked at.
+    If is_open holds on to something for the next task, the gate provides
+    unreserve to give it back when no task could be started.  Gates that can
+    open without any of our tasks finishing set polls.
+    """
+    # pylint: disable=too-many-arguments
+    running = {}
+    fatal_failure = None
+    open_gates = [gate for gate in gates if hasattr(gate, "is_open")]
+    reserving_gates = [gate for gate in gates if hasattr(gate, "unreserve")]
+    polling = [False]
+
+    def _closed_by(gate):
+        if getattr(gate, "polls", False):
+            polling[0] = True
+        return False
+
+    def _is_open(task_name):
+        for gate in open_gates:
+            if not gate.is_open(task_name):
+                return _closed_by(gate)
+        return True
+
+    def _accept(component_task):
+        acquired = []
+        for gate in gates:
+            if not gate.acquire(component_task):
+                _release_gates(acquired, component_task)
+                return _closed_by(gate)
+            acquired.append(gate)
+        return True
+
+    def _start_ready_tasks(pool):
+        polling[0] = False
+        while fatal_failure is None and len(running) < jobs:
+            component_task = task_queue.pop_ready(
+                _accept if gates else None, _is_open if open_gates else None
+            )
+            if component_task is None:
+                for gate in reserving_gates:
+                    gate.unreserve()
+                return
+            if up_to_date_function(component_task):
+                _release_gates(gates, component_task)
+                _print_heading(executor, component_task)
+                executor.message("\t(Up to date)")
+                executor.message("")
+                devpipeline_core.trace.task_event(component_task, "up to date")
                 task_queue.resolve(component_task)
-            except Exception as failure:  # pylint: disable=broad-except
-                fail_function(failure, component_task)
-            config_info.executor.message("")
+                continue
+            future = pool.submit(
+                getattr(pool, "run_task", _run_task),
+                task_dict[component_task[1]],
+                executor,
+                component_task,
+                config_info_fn,
+            )
+            running[future] = component_task
+
+    with _make_pool(jobs, executor) as pool:
+        _start_ready_tasks(pool)
+        while running:
+            done, _ = concurrent.futures.wait(
+                running,
+                timeout=_GATE_POLL_INTERVAL if polling[0] else None,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                component_task = running.pop(future)
+                _release_gates(gates, component_task)
+                failure = future.exception()
+                if failure is None:
+                    task_queue.resolve(component_task)
+                    success_function(component_task, future.result())
+                else:
+                    try:
+                        fail_function(failure, component_task)
+                    except Exception as fatal:  # pylint: disable=broad-except
+                        fatal_failure = fatal_failure or fatal
+            _start_ready_tasks(pool)
+    if fatal_failure is not None:
+        raise fatal_failure
+    if task_queue:
+        raise Exception("Resolve failure")
 
 
 class _PartialFailureException(Exception):
     def __init__(self, failed):
+        super().__init__()
         self.failed = failed
 
+    def __str__(self):
+        def _format_task(task):
+            return "{} ({})".format(task[0], task[1])
+
+        lines = []
+        for task, skipped, failure in self.failed:
+            lines.append("{} failed: {}".format(_format_task(task), failure))
+            if skipped:
+                lines.append(
+                    "  skipped: {}".format(", ".join(map(_format_task, skipped)))
+                )
+        return "\n".join(lines)
+
+
+_DURATIONS_FILE = "task-durations.json"
+
+
+def _fifo_priority(dep_manager, durations):
+    del dep_manager
+    del durations
+
+
+def _critical_path_priority(dep_manager, durations):
+    known_durations = {}
+    for component, task in dep_manager.get_tasks():
+        duration = durations.get(component).get(task)
+        if duration is not None:
+            known_durations[(component, task)] = duration
+    # Tasks that have never completed are assumed to be average; if nothing
+    # has been recorded, every task has the same weight and the longest chain
+    # of tasks is the critical path.
+    default_duration = 1.0
+    if known_durations:
+        default_duration = sum(known_durations.values()) / len(known_durations)
+    path_weights = dep_manager.get_critical_paths(
+        lambda component_task: known_durations.get(component_task, default_duration)
+    )
+    return lambda component_task: path_weights.get(component_task, 0)
+
+
+_SCHEDULES = {
+    "critical-path": _critical_path_priority,
+    "fifo": _fifo_priority,
+}
+
 
 def process_tasks(arguments, tasks, config_fn):
     def _work_fn(targets, full_config):
@@ -91,31 +474,165 @@ def process_tasks(arguments, tasks, config_fn):
             task_dict[name] = fn
 
         executor = _get_executor(arguments)
+        trace_path = _get_trace_path(arguments)
         resolver = _get_resolver(arguments)
-        dep_manager = resolver(targets, full_config, task_order)
-        task_queue = dep_manager.get_queue()
-        config_info = devpipeline_core.configinfo.ConfigInfo(executor)
+        dep_manager = devpipeline_core.graphcache.resolve(
+            arguments.dependencies,
+            resolver,
+            targets,
+            full_config,
+            task_order,
+            **_get_resolver_args(arguments)
+        )
+        durations = devpipeline_core.statefile.ComponentState(
+            full_config, _DURATIONS_FILE
+        )
+        schedule = _get_schedule(arguments)
+        task_queue = dep_manager.get_queue(schedule(dep_manager, durations))
+        jobs = _get_jobs(arguments)
+        resource_gate = _get_resource_gate(arguments, full_config)
+        # jobs for nested builds to share through a jobserver
+        server_jobs = jobs
+        if jobs is None:
+            jobs = 1
+            server_jobs = 1
+            if resource_gate is not None:
+                # the budget decides how many tasks run at once
+                jobs = max(1, len(task_queue))
+                server_jobs = max(1, math.ceil(resource_gate.budget["cpu"]))
+        gates = []
+        task_pools = _get_task_pools(arguments, jobs)
+        if task_pools is not None:
+            gates.append(task_pools)
+            jobs = task_pools.total
+        if resource_gate is not None:
+            gates.append(resource_gate)
+        job_server = _get_jobserver(arguments, server_jobs)
+        base_environment = None
+        if job_server is not None:
+            gates.append(job_server)
+            base_environment = dict(os.environ, MAKEFLAGS=job_server.makeflags)
+        environments = devpipeline_core.env.EnvironmentCache(base_environment)
+        fingerprints = devpipeline_core.fingerprint.TaskFingerprints(
+            full_config, dep_manager, environments.get
+        )
+        incremental = getattr(arguments, "incremental", False)
+        record_state = not getattr(executor, "dry_run", False)
+        trace = None
+        if trace_path:
+            trace = devpipeline_core.trace.start()
+        usage = devpipeline_core.usage.start()
+        history = []
+        start_times = {}
+        run_started = time.time()
 
         try:
             failed = []
 
+            def _make_config_info(task):
+                start_times[task] = time.monotonic()
+                config = full_config.get(task[0])
+                task_executor = executor
+                if hasattr(executor, "start_task"):
+                    task_executor = executor.start_task(task, config)
+                config_info = devpipeline_core.configinfo.ConfigInfo(task_executor)
+                config_info.config = config
+                config_info.env = environments.get(config_info.config)
+                return config_info
+
+            def _is_up_to_date(task):
+                # always calculate the fingerprint so dependent tasks can use it
+                up_to_date = fingerprints.is_current(task) and incremental
+                if up_to_date:
+                    history.append((task, None, "up to date"))
+                return up_to_date
+
+            def _record_success(task, duration):
+                history.append((task, duration, "success"))
+                if record_state:
+                    durations.get(task[0])[task[1]] = duration
+                    fingerprints.succeeded(task)
+
+            def _record_failure(task):
+                fingerprints.failed(task)
+                duration = time.monotonic() - start_times.get(task, time.monotonic())
+                history.append((task, duration, "failure"))
+
             def _keep_going_on_failure(failure, task):
+                _record_failure(task)
                 skipped = task_queue.fail(task)
+                for skipped_task in skipped:
+                    devpipeline_core.trace.task_event(skipped_task, "skipped")
+                    history.append((skipped_task, None, "skipped"))
                 failed.append((task, skipped, str(failure)))
 
             def _fail_immediately(failure, task):
-                del task
+                _record_failure(task)
                 raise failure
 
             fail_fn = _fail_immediately
             if arguments.keep_going:
                 fail_fn = _keep_going_on_failure
 
-            _execute_targets(task_dict, task_queue, config_info, full_config, fail_fn)
+            _execute_targets(
+                task_dict,
+                task_queue,
+                executor,
+                _make_config_info,
+                _is_up_to_date,
+                _record_success,
+                fail_fn,
+                jobs,
+                gates,
+            )
             if failed:
                 raise _PartialFailureException(failed)
         finally:
-            full_config.write()
+            if trace is not None:
+                devpipeline_core.trace.stop()
+            devpipeline_core.usage.stop()
+            try:
+                close_fn = getattr(executor, "close", None)
+                if close_fn is not None:
+                    close_fn()
+                if job_server is not None:
+                    job_server.close()
+            finally:
+                durations.write()
+                fingerprints.write()
+                full_config.write()
+            task_usage = usage.get_usage()
+            # Reports are extras; failing to save one shouldn't hide how the
+            # tasks went.
+            reports = []
+            if record_state:
+                reports.append(
+                    (
+                        "resource usage",
+                        lambda: devpipeline_core.usage.save(full_config, task_usage),
+                    )
+                )
+                reports.append(
+                    (
+                        "task history",
+                        lambda: devpipeline_core.history.record_run(
+                            full_config,
+                            run_started,
+                            arguments.executor,
+                            arguments.dependencies,
+                            history,
+                        ),
+                    )
+                )
+            if trace is not None:
+                reports.append(("trace", lambda: trace.write(trace_path)))
+            for name, save_fn in reports:
+                try:
+                    save_fn()
+                except Exception as failure:  # pylint: disable=broad-except
+                    executor.warning("Couldn't save the {}: {}".format(name, failure))
+            if getattr(arguments, "resource_usage", False) and task_usage:
+                print(devpipeline_core.usage.format_summary(task_usage))
 
     process_targets(arguments, _work_fn, config_fn)
 
@@ -127,6 +644,88 @@ def _get_executor(parsed_args):
     raise Exception("{} isn't a valid executor".format(parsed_args.executor))
 
 
+def _get_jobs(parsed_args):
+    jobs = getattr(parsed_args, "jobs", None)
+    if jobs is not None and jobs < 1:
+        raise Exception("{} isn't a valid number of jobs".format(jobs))
+    return jobs
+
+
+def _get_trace_path(parsed_args):
+    trace_path = getattr(parsed_args, "trace", None)
+    if trace_path:
+        # check now rather than losing the trace once every task has run
+        directory = os.path.dirname(os.path.abspath(trace_path))
+        if os.path.isdir(trace_path) or not os.access(directory, os.W_OK):
+            raise Exception("{} isn't a valid trace path".format(trace_path))
+    return trace_path
+
+
+def _get_jobserver(parsed_args, jobs):
+    if not getattr(parsed_args, "jobserver", False):
+        return None
+    job_server = devpipeline_core.jobserver.JobServer.inherit(os.environ)
+    if job_server is None:
+        job_server = devpipeline_core.jobserver.JobServer.create(jobs)
+    return job_server
+
+
+def _get_task_pools(parsed_args, jobs):
+    task_jobs = getattr(parsed_args, "task_jobs", None)
+    if not task_jobs:
+        return None
+    limits = {}
+    for task_limit in task_jobs:
+        task, _, limit = task_limit.partition("=")
+        try:
+            limits[task] = int(limit)
+        except ValueError:
+            limits[task] = 0
+        if not task or limits[task] < 1:
+            raise Exception("{} isn't a valid task job limit".format(task_limit))
+    return _TaskPools(limits, jobs)
+
+
+def _get_resource_gate(parsed_args, full_config):
+    cpu_budget = getattr(parsed_args, "cpu_budget", None)
+    memory_budget = getattr(parsed_args, "memory_budget", None)
+    if cpu_budget is None and memory_budget is None:
+        return None
+    budget = devpipeline_core.resources.get_host_budget()
+    if cpu_budget is not None:
+        if cpu_budget <= 0:
+            raise Exception("{} isn't a valid CPU budget".format(cpu_budget))
+        budget["cpu"] = cpu_budget
+    if memory_budget is not None:
+        budget["memory"] = devpipeline_core.resources.parse_size(memory_budget)
+    return devpipeline_core.resources.ResourceGate(full_config, budget)
+
+
+def _get_schedule(parsed_args):
+    schedule = getattr(parsed_args, "schedule", "fifo")
+    schedule_fn = _SCHEDULES.get(schedule)
+    if schedule_fn:
+        return schedule_fn
+    raise Exception("{} isn't a valid schedule".format(schedule))
+
+
+_GRAPH_TYPES = {
+    "compact": devpipeline_core.taskqueue.CompactDependencyManager,
+    "standard": devpipeline_core.taskqueue.DependencyManager,
+}
+
+
+def _get_resolver_args(parsed_args):
+    graph = getattr(parsed_args, "graph", "standard")
+    if graph == "standard":
+        # not every resolver supports alternative graphs
+        return {}
+    manager_type = _GRAPH_TYPES.get(graph)
+    if manager_type:
+        return {"manager_type": manager_type}
+    raise Exception("{} isn't a valid graph".format(graph))
+
+
 def _get_resolver(parsed_args):
     if "dependencies" not in parsed_args:
         parsed_args.dependencies = "deep"
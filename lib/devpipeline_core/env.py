@@ -4,7 +4,9 @@
 Functionality related to environment modification.
 """
 
+import collections.abc
 import os
+import types
 
 
 def _append_prepend_env(config, suffix_key, base_key, builder_string, current_value):
@@ -18,38 +20,160 @@ def _append_prepend_env(config, suffix_key, base_key, builder_string, current_va
 
 
 def _prepend_env(config, base_key, current_value):
-    return _append_prepend_env(config, "prepend", base_key, "{2}{}{0}", current_value)
+    return _append_prepend_env(config, "prepend", base_key, "{2}{1}{0}", current_value)
 
 
 def _append_env(config, base_key, current_value):
     return _append_prepend_env(config, "append", base_key, "{}{}{}", current_value)
 
 
-def _apply_change(env_set, env_key, value, component_config):
+def _apply_change(changes, env_key, value, component_config):
     if value is not None:
-        env_set[env_key] = value
+        changes[env_key] = value
     else:
         # either an override or erase
         key = "env.{}".format(env_key.lower())
         if key in component_config:
-            env_set[env_key] = os.pathsep.join(component_config.get_list(key))
+            changes[env_key] = os.pathsep.join(component_config.get_list(key))
         else:
-            if env_key in env_set:
-                del env_set[env_key]
+            changes[env_key] = None
 
 
-def create_environment(component_config):
+def _calculate_changes(component_config, base):
+    # Changes map variable names to new values; a value of None means the
+    # variable is removed.
+    changes = {}
+    for env in component_config.get_list("dp.env_list"):
+        real_env = env.upper()
+        value = base.get(real_env)
+        value = _prepend_env(component_config, env, value)
+        value = _append_env(component_config, env, value)
+        _apply_change(changes, real_env, value, component_config)
+    return changes
+
+
+class Environment(collections.abc.MutableMapping):
+    """
+    A dictionary-like environment made of changes layered over a read-only
+    base environment.
+
+    Environments share their base and, until one of them is modified, their
+    changes, so creating one doesn't copy anything.  Use materialize to get a
+    plain dictionary (e.g., to hand to subprocess).
+    """
+
+    def __init__(self, base, changes):
+        self._base = base
+        self._changes = changes
+        self._owns_changes = False
+        self._materialized = None
+
+    def _modify(self):
+        if not self._owns_changes:
+            self._changes = dict(self._changes)
+            self._owns_changes = True
+        self._materialized = None
+
+    def __getitem__(self, key):
+        if key in self._changes:
+            value = self._changes[key]
+            if value is None:
+                raise KeyError(key)
+            return value
+        return self._base[key]
+
+    def __setitem__(self, key, value):
+        self._modify()
+        self._changes[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._modify()
+        self._changes[key] = None
+
+    def __iter__(self):
+        for key in self._base:
+            if key not in self._changes:
+                yield key
+        for key, value in self._changes.items():
+            if value is not None:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def copy(self):
+        """Create an independent copy of the environment."""
+        # neither environment can modify the shared changes from now on
+        self._owns_changes = False
+        return Environment(self._base, self._changes)
+
+    def materialize(self):
+        """
+        Retrieve the environment as a plain dictionary.  The dictionary is
+        reused until the environment is modified, so it shouldn't be changed.
+        """
+        if self._materialized is None:
+            self._materialized = dict(self)
+        return self._materialized
+
+
+def materialize(environment):
+    """
+    Convert an environment to something subprocess accepts.  An Environment
+    becomes a plain dictionary; anything else is returned unchanged.
+
+    Arguments:
+    environment - a dictionary-like environment, or None
+    """
+    if isinstance(environment, Environment):
+        return environment.materialize()
+    return environment
+
+
+def create_environment(component_config, base=None):
     """
     Create a modified environment.
 
     Arguments
     component_config - The configuration for a component.
+    base - The environment to modify.  If this isn't provided, a copy of the
+           current process's environment is used.
     """
-    ret = os.environ.copy()
-    for env in component_config.get_list("dp.env_list"):
-        real_env = env.upper()
-        value = os.environ.get(real_env)
-        value = _prepend_env(component_config, env, value)
-        value = _append_env(component_config, env, value)
-        _apply_change(ret, real_env, value, component_config)
-    return ret
+    if base is None:
+        base = os.environ.copy()
+    return Environment(base, _calculate_changes(component_config, base))
+
+
+class EnvironmentCache:
+    """
+    Create environments for components, calculating each component's changes
+    only once.  Every environment is layered over a single snapshot of the
+    process's environment taken when the cache is created.
+
+    Arguments
+    base - The environment to modify.  If this isn't provided, a copy of the
+           current process's environment is used.
+    """
+
+    # pylint: disable=too-few-public-methods
+    def __init__(self, base=None):
+        if base is None:
+            base = os.environ
+        self._base = types.MappingProxyType(dict(base))
+        self._changes = {}
+
+    def get(self, component_config):
+        """
+        Retrieve the environment for a component.  Every call returns a new
+        environment, so modifications don't affect other callers.
+
+        Arguments
+        component_config - The configuration for a component.
+        """
+        changes = self._changes.get(component_config.name)
+        if changes is None:
+            changes = _calculate_changes(component_config, self._base)
+            self._changes[component_config.name] = changes
+        return Environment(self._base, changes)
@@ -5,19 +5,194 @@ This modules includes various executor classes.  These can be used by Command,
 or as templates to implement new executor classes.
 """
 
+import codecs
+import concurrent.futures
+import gzip
 import os
+import os.path
+import shutil
+import signal
 import subprocess
+import sys
+import tempfile
+import threading
+
+import devpipeline_core.env
+import devpipeline_core.paths
+import devpipeline_core.trace
+import devpipeline_core.usage
+
+
+# posix_spawn avoids copying the page tables of a large Python process, which
+# makes a difference for tools that run thousands of short commands.
+_USE_POSIX_SPAWN = hasattr(os, "posix_spawnp")
+_SPAWN_OUTPUTS = {"stdout": 1, "stderr": 2}
+# Python ignores these; restore the defaults the way subprocess does, or a
+# pipeline like "yes | head -1" complains about a broken pipe.
+_SPAWN_SIGDEF = [
+    getattr(signal, name)
+    for name in ["SIGPIPE", "SIGXFZ", "SIGXFSZ"]
+    if hasattr(signal, name)
+]
+
+
+def _can_spawn(kwargs):
+    if not _USE_POSIX_SPAWN or not isinstance(kwargs.get("args"), (list, tuple)):
+        return False
+    for key, value in kwargs.items():
+        if key in _SPAWN_OUTPUTS:
+            if value is not None and not hasattr(value, "fileno"):
+                return False
+        elif key != "args":
+            # anything else (cwd, shell, ...) needs subprocess
+            return False
+    return True
+
+
+def _spawn(environment, args, **outputs):
+    file_actions = []
+    for key, value in outputs.items():
+        if value is not None:
+            value.flush()
+            file_actions.append(
+                (os.POSIX_SPAWN_DUP2, value.fileno(), _SPAWN_OUTPUTS[key])
+            )
+    if environment is None:
+        environment = os.environ
+    pid = os.posix_spawnp(
+        args[0],
+        args,
+        environment,
+        file_actions=file_actions,
+        setsigdef=_SPAWN_SIGDEF,
+    )
+    _, status, rusage = os.wait4(pid, 0)
+    devpipeline_core.usage.record(devpipeline_core.usage.rusage_values(rusage))
+    return_code = os.waitstatus_to_exitcode(status)
+    if return_code:
+        raise subprocess.CalledProcessError(return_code, args)
+
+
+def _reap(process):
+    # Reap the process here so its resource usage isn't thrown away.  Returns
+    # the usage values, or None if they aren't available.
+    if not hasattr(os, "wait4"):
+        process.wait()
+        return None
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return devpipeline_core.usage.rusage_values(rusage)
+
+
+def _wait(process):
+    values = _reap(process)
+    if values is not None:
+        devpipeline_core.usage.record(values)
+    return process.returncode
+
+
+def _check_call(environment, **kwargs):
+    with subprocess.Popen(env=environment, **kwargs) as process:
+        return_code = _wait(process)
+    if return_code:
+        raise subprocess.CalledProcessError(return_code, kwargs.get("args"))
+
+
+_READ_SIZE = 64 * 1024
 
 
 def _execute_single(environment, **kwargs):
     # pylint: disable=broad-except
+    environment = devpipeline_core.env.materialize(environment)
     try:
-        subprocess.check_call(env=environment, **kwargs)
+        with devpipeline_core.trace.command(kwargs.get("args")):
+            if _can_spawn(kwargs):
+                _spawn(environment, **kwargs)
+            else:
+                _check_call(environment, **kwargs)
     except Exception as failure:
         raise failure
 
 
+async def _stream(reader, output):
+    # Read in chunks rather than lines; a line can be longer than any limit
+    # (e.g., a linker's command line).
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    data = await reader.read(_READ_SIZE)
+    while data:
+        output.write(decoder.decode(data))
+        output.flush()
+        data = await reader.read(_READ_SIZE)
+    output.write(decoder.decode(b"", final=True))
+
+
+# Commands run asynchronously are reaped from these threads instead of by
+# asyncio, which throws away their resource usage.  The event loop's own
+# threads can't be used, since they might all be running tasks waiting on
+# these commands.
+_REAPER = concurrent.futures.ThreadPoolExecutor(
+    max_workers=32, thread_name_prefix="dev-pipeline-reaper"
+)
+
+
+async def _read_pipe(loop, pipe, output):
+    # pylint: disable=import-outside-toplevel
+    import asyncio
+
+    reader = asyncio.StreamReader()
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), pipe
+    )
+    try:
+        await _stream(reader, output)
+    finally:
+        transport.close()
+
+
+async def _execute_single_async(environment, args, shell=False, **kwargs):
+    # pylint: disable=import-outside-toplevel
+    # asyncio is slow to import and only the async executor needs it
+    import asyncio
+
+    environment = devpipeline_core.env.materialize(environment)
+    # callers can still send output somewhere else, the same as with subprocess
+    outputs = {}
+    for name, output in [("stdout", sys.stdout), ("stderr", sys.stderr)]:
+        if kwargs.get(name) is None:
+            kwargs[name] = subprocess.PIPE
+            outputs[name] = output
+    loop = asyncio.get_running_loop()
+    with devpipeline_core.trace.command(args):
+        process = subprocess.Popen(args, shell=shell, env=environment, **kwargs)
+        streamed = False
+        try:
+            await asyncio.gather(
+                *[
+                    _read_pipe(loop, getattr(process, name), output)
+                    for name, output in outputs.items()
+                ]
+            )
+            streamed = True
+        finally:
+            if not streamed:
+                # Popen.kill would reap the process, losing its usage; it can't
+                # be reaped by anything else, so its pid is still its own
+                os.kill(process.pid, signal.SIGKILL)
+            values = await loop.run_in_executor(_REAPER, _reap, process)
+        if values is not None:
+            devpipeline_core.usage.record(values)
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, args)
+
+
 class _ExecutorBase:
+    # Executors that don't really run commands set this so nothing about the
+    # run is recorded as if work had been done.
+    dry_run = False
+    # Executors that provide execute_async set this so tasks are run from an
+    # event loop instead of a pool of threads.
+    asynchronous = False
+
     def message(self, msg):
         # pylint: disable=no-self-use
         """
@@ -123,6 +298,215 @@ _VERBOSE_EXECUTOR = (
 )
 
 
+class AsyncExecutor(_ExecutorBase):
+
+    """
+    This executor class runs commands with asyncio, streaming their output as
+    it arrives.  Task functions that are coroutines can await execute_async,
+    so any number of tasks can run commands from a single thread; other task
+    functions can call execute as usual.
+    """
+
+    asynchronous = True
+
+    def __init__(self):
+        # the event loop tasks run on (set by the task runner), so execute can
+        # send commands there instead of starting a loop for each call
+        self.loop = None
+
+    def message(self, msg):
+        pass
+
+    async def execute_async(self, environment, *args):
+        """
+        Execute a series of commands without blocking the event loop.
+
+        Arguments:
+        environment - a dictionary-like object containing the environment
+                      commands should be executed in
+        args - A list of dictionaries with the same arguments as subprocess
+               calls.
+        """
+        for cmd in args:
+            await _execute_single_async(environment, **cmd)
+
+    def execute(self, environment, *args):
+        # pylint: disable=import-outside-toplevel
+        import asyncio
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            # A coroutine that didn't await execute_async blocks the loop no
+            # matter what, so run the commands directly.
+            for cmd in args:
+                _execute_single(environment, **cmd)
+            return
+        if self.loop is None:
+            asyncio.run(self.execute_async(environment, *args))
+        else:
+            asyncio.run_coroutine_threadsafe(
+                self.execute_async(environment, *args), self.loop
+            ).result()
+
+
+_ASYNC_EXECUTOR = (
+    AsyncExecutor,
+    "An executor that runs commands with asyncio so tasks that support it can "
+    "run concurrently without a thread each.  Information printed by executed "
+    "tools is streamed without modification.",
+)
+
+_OUTPUT_LOCK = threading.Lock()
+
+
+class _TaskLog:
+    """
+    Output captured from a single task.  Output is held in a fixed-size buffer
+    that's appended to the task's log file each time it fills, so memory use
+    doesn't depend on how much a task prints.
+    """
+
+    def __init__(self, path, buffer_size, compress):
+        self._buffer = bytearray()
+        self._buffer_size = buffer_size
+        self._open_fn = gzip.open if compress else open
+        self._temporary = path is None
+        if self._temporary:
+            # without a configuration directory, the log only lasts as long as
+            # the task
+            handle, path = tempfile.mkstemp(suffix=".log")
+            os.close(handle)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._log_file = self._open_fn(path, "wb")
+
+    def _spill(self):
+        self._log_file.write(bytes(self._buffer))
+        self._buffer.clear()
+
+    def write(self, data):
+        """Add output to the log."""
+        self._buffer.extend(data)
+        if len(self._buffer) >= self._buffer_size:
+            self._spill()
+
+    def close(self, output=None):
+        """
+        Finish the log, optionally copying everything in it to output.
+
+        Arguments:
+        output - a binary file to copy the log to
+        """
+        self._spill()
+        self._log_file.close()
+        if output is not None:
+            with self._open_fn(self.path, "rb") as log_file:
+                shutil.copyfileobj(log_file, output)
+            output.flush()
+        if self._temporary:
+            os.remove(self.path)
+
+
+def _execute_captured(environment, task_log, **kwargs):
+    environment = devpipeline_core.env.materialize(environment)
+    kwargs.setdefault("stdout", subprocess.PIPE)
+    kwargs.setdefault("stderr", subprocess.STDOUT)
+    with devpipeline_core.trace.command(kwargs.get("args")):
+        with subprocess.Popen(env=environment, **kwargs) as process:
+            if process.stdout is not None:
+                data = process.stdout.read1(_READ_SIZE)
+                while data:
+                    task_log.write(data)
+                    data = process.stdout.read1(_READ_SIZE)
+            return_code = _wait(process)
+        if return_code:
+            raise subprocess.CalledProcessError(return_code, kwargs.get("args"))
+
+
+class _CapturedTaskExecutor(_ExecutorBase):
+    """The part of a CaptureExecutor that handles a single task."""
+
+    def __init__(self, task_log):
+        self._task_log = task_log
+
+    def message(self, msg):
+        self._task_log.write("{}\n".format(msg).encode())
+
+    def execute(self, environment, *args):
+        for cmd in args:
+            _execute_captured(environment, self._task_log, **cmd)
+
+    def finish_task(self, failed):
+        """
+        Close the task's log, printing it if the task failed.
+
+        Arguments:
+        failed - whether the task failed
+        """
+        if failed:
+            with _OUTPUT_LOCK:
+                self._task_log.close(sys.stdout.buffer)
+                print("\t(Log saved to {})".format(self._task_log.path))
+        else:
+            self._task_log.close()
+
+
+class CaptureExecutor(_ExecutorBase):
+
+    """
+    This executor class captures the output of each task to a log file in the
+    component's configuration directory.  The log is only printed if the task
+    fails, so output from concurrent tasks doesn't get mixed together.
+    """
+
+    buffer_size = 64 * 1024
+    compress = False
+
+    def message(self, msg):
+        pass
+
+    def start_task(self, component_task, config):
+        """
+        Create an executor to capture the output of a single task.
+
+        Arguments:
+        component_task - the (component, task) about to run
+        config - the component's configuration
+        """
+        path = None
+        if config is not None and config.get("dp.config_dir"):
+            filename = "{}.{}.log".format(*component_task)
+            if self.compress:
+                filename += ".gz"
+            path = devpipeline_core.paths.make_path(config, "logs", filename)
+        return _CapturedTaskExecutor(_TaskLog(path, self.buffer_size, self.compress))
+
+
+_CAPTURE_EXECUTOR = (
+    CaptureExecutor,
+    "An executor that saves the output of each task to a log file and only "
+    "prints it if the task fails.",
+)
+
+
+class CompressedCaptureExecutor(CaptureExecutor):
+
+    """This executor class captures the output of each task to gzipped logs."""
+
+    compress = True
+
+
+_CAPTURE_GZIP_EXECUTOR = (
+    CompressedCaptureExecutor,
+    "An executor that saves the output of each task to a gzipped log file and "
+    "only prints it if the task fails.",
+)
+
+
 class DryRunExecutor(_ExecutorBase):
 
     """
@@ -130,6 +514,8 @@ class DryRunExecutor(_ExecutorBase):
     doesn't execute them.
     """
 
+    dry_run = True
+
     def execute(self, environment, *args):
         for cmd in args:
             cmd_args = cmd.get("args")
@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+
+"""Detect tasks whose inputs haven't changed since they last succeeded."""
+
+import hashlib
+import json
+
+import devpipeline_core.env
+import devpipeline_core.statefile
+
+_FINGERPRINTS_FILE = "task-fingerprints.json"
+
+# How many jobs a build runs with (and where its jobserver is) doesn't change
+# what it produces.
+_IGNORED_VARIABLES = frozenset(["MAKEFLAGS", "MFLAGS"])
+
+
+def _get_config_values(component_config):
+    return sorted((key, component_config.get(key)) for key in component_config)
+
+
+def config_fingerprint(component_config):
+    """
+    Create a fingerprint of a component's configuration alone.
+
+    Arguments:
+    component_config - the component's configuration
+    """
+    if component_config is None:
+        return None
+    return hashlib.sha256(
+        json.dumps(_get_config_values(component_config)).encode()
+    ).hexdigest()
+
+
+def _calculate(component_config, environment, task, dependency_fingerprints):
+    config_values = _get_config_values(component_config)
+    env_values = sorted(
+        (key, value)
+        for key, value in environment.items()
+        if key not in _IGNORED_VARIABLES
+    )
+    return hashlib.sha256(
+        json.dumps([task, config_values, env_values, dependency_fingerprints]).encode()
+    ).hexdigest()
+
+
+class TaskFingerprints:
+    """
+    Fingerprints of each task's inputs: the component's configuration, the
+    component's environment, and the fingerprints of every task it depends on.
+    Fingerprints are saved when a task succeeds, so a task with a matching
+    fingerprint would do the same work it did last time.
+    """
+
+    def __init__(
+        self,
+        full_config,
+        dep_manager,
+        environment_fn=devpipeline_core.env.create_environment,
+    ):
+        self._full_config = full_config
+        self._dep_manager = dep_manager
+        self._environment_fn = environment_fn
+        self._saved = devpipeline_core.statefile.ComponentState(
+            full_config, _FINGERPRINTS_FILE
+        )
+        self._current = {}
+
+    def is_current(self, component_task):
+        """
+        Calculate a task's fingerprint and check it against the fingerprint
+        from the last time the task succeeded.  This should be called once all
+        of the task's dependencies are complete.
+        """
+        dependencies = sorted(self._dep_manager.get_dependencies(component_task))
+        component_config = self._full_config.get(component_task[0])
+        fingerprint = _calculate(
+            component_config,
+            self._environment_fn(component_config),
+            component_task[1],
+            [self._current.get(dependency) for dependency in dependencies],
+        )
+        self._current[component_task] = fingerprint
+        saved = self._saved.get(component_task[0])
+        return saved.get(component_task[1]) == fingerprint
+
+    def succeeded(self, component_task):
+        """Save the fingerprint of a task that succeeded."""
+        saved = self._saved.get(component_task[0])
+        saved[component_task[1]] = self._current[component_task]
+
+    def failed(self, component_task):
+        """Forget the fingerprint of a task that failed."""
+        self._saved.get(component_task[0]).pop(component_task[1], None)
+
+    def write(self):
+        """Save all fingerprints."""
+        self._saved.write()
@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+
+"""Cache resolved dependency graphs between runs."""
+
+import hashlib
+import json
+
+import devpipeline_core.paths
+import devpipeline_core.resolve
+import devpipeline_core.statefile
+import devpipeline_core.taskqueue
+import devpipeline_core.version
+
+_CACHE_FILE = "resolved-graph.json"
+
+
+def _graph_components(full_config, cached_components):
+    # A deep resolve only reads the configuration of components that end up in
+    # the graph; if none of those changed, the graph can't have changed.
+    del full_config
+    return cached_components
+
+
+def _all_components(full_config, cached_components):
+    # Any component in the project might have started depending on a target.
+    del cached_components
+    return list(full_config.keys())
+
+
+# Only resolvers whose results depend on nothing but depends.<task> values can
+# be cached.
+_RELEVANT_COMPONENTS = {
+    devpipeline_core.resolve.calculate_dependencies: _graph_components,
+    # pylint: disable=protected-access
+    devpipeline_core.resolve._process_reverse: _all_components,
+}
+
+
+def _fingerprint(full_config, components, tasks):
+    digest = hashlib.sha256()
+    for name in components:
+        component = full_config.get(name)
+        depends = None
+        if component is not None:
+            depends = [component.get("depends.{}".format(task)) for task in tasks]
+        digest.update(json.dumps([name, depends]).encode())
+    return digest.hexdigest()
+
+
+def _save_graph(dep_manager, tasks):
+    component_ids = {}
+    task_ids = {task: task_id for task_id, task in enumerate(tasks)}
+    node_ids = {}
+    nodes = []
+    for component, task in dep_manager.get_tasks():
+        component_id = component_ids.setdefault(component, len(component_ids))
+        node_ids[(component, task)] = len(nodes)
+        nodes.append([component_id, task_ids[task]])
+    return {
+        "components": list(component_ids),
+        "nodes": nodes,
+        "dependencies": [
+            [node_ids[dependency] for dependency in dep_manager.get_dependencies(node)]
+            for node in dep_manager.get_tasks()
+        ],
+    }
+
+
+def _load_graph(graph, tasks, manager_type):
+    components = graph["components"]
+    nodes = [(components[component], tasks[task]) for component, task in graph["nodes"]]
+    dep_manager = manager_type(tasks)
+    for node, dependencies in zip(nodes, graph["dependencies"]):
+        dep_manager.add_dependency(node, None)
+        for dependency in dependencies:
+            dep_manager.add_dependency(node, nodes[dependency])
+    return dep_manager
+
+
+def _get_cache_path(full_config, targets):
+    first_target = next(iter(targets), None)
+    if first_target is not None:
+        config = full_config.get(first_target)
+        if config is not None and config.get("dp.config_dir"):
+            return devpipeline_core.paths.make_path(config, _CACHE_FILE)
+    return None
+
+
+def resolve(resolver_name, resolver, targets, full_config, tasks, **resolver_args):
+    """
+    Resolve dependencies, reusing the graph from an earlier run if nothing it
+    depends on has changed.  The cache is stored in the first target's
+    configuration directory.
+
+    Arguments:
+    resolver_name - the name the resolver was registered with
+    resolver - the resolver function
+    targets - the targets to resolve
+    full_config - the full project configuration
+    tasks - the ordered list of tasks
+    resolver_args - any additional arguments to pass to the resolver
+    """
+    # pylint: disable=too-many-arguments
+    relevant_fn = _RELEVANT_COMPONENTS.get(resolver)
+    path = _get_cache_path(full_config, targets)
+    if relevant_fn is None or path is None:
+        return resolver(targets, full_config, tasks, **resolver_args)
+
+    manager_type = resolver_args.get(
+        "manager_type", devpipeline_core.taskqueue.DependencyManager
+    )
+    header = [devpipeline_core.version.STRING, resolver_name, list(targets), tasks]
+    cached = devpipeline_core.statefile.load_state(path)
+    if cached.get("header") == header:
+        components = relevant_fn(full_config, cached["graph"]["components"])
+        if cached["fingerprint"] == _fingerprint(full_config, components, tasks):
+            return _load_graph(cached["graph"], tasks, manager_type)
+
+    dep_manager = resolver(targets, full_config, tasks, **resolver_args)
+    graph = _save_graph(dep_manager, tasks)
+    components = relevant_fn(full_config, graph["components"])
+    devpipeline_core.statefile.write_state(
+        path,
+        {
+            "header": header,
+            "fingerprint": _fingerprint(full_config, components, tasks),
+            "graph": graph,
+        },
+    )
+    return dep_manager
@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+
+"""A history of every task that's been run, kept in an SQLite database."""
+
+import sqlite3
+
+import devpipeline_core.fingerprint
+import devpipeline_core.paths
+
+_HISTORY_FILE = "build-history.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    executor TEXT,
+    resolver TEXT
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    component TEXT NOT NULL,
+    task TEXT NOT NULL,
+    duration REAL,
+    outcome TEXT NOT NULL,
+    config_fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_by_name ON tasks (component, task, run_id);
+"""
+
+# the durations of successful tasks from the last few runs, newest first
+_RECENT_DURATIONS = """
+SELECT component, task, duration, run_id FROM tasks
+WHERE outcome = 'success' AND run_id IN (
+    SELECT id FROM runs ORDER BY id DESC LIMIT ?
+)
+ORDER BY run_id DESC
+"""
+
+
+class BuildHistory:
+    """
+    A history database.  Each run is recorded with the executor and resolver
+    it used, and every task in a run is recorded with its duration, outcome,
+    and a fingerprint of its component's configuration.
+    """
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        """Close the database."""
+        self._connection.close()
+
+    def add_run(self, started, executor, resolver, records):
+        """
+        Add a run to the history.
+
+        Arguments:
+        started - when the run started, in seconds since the epoch
+        executor - the name of the executor used
+        resolver - the name of the dependency resolver used
+        records - a list of (component, task, duration, outcome, fingerprint)
+        """
+        with self._connection:
+            run_id = self._connection.execute(
+                "INSERT INTO runs (started, executor, resolver) VALUES (?, ?, ?)",
+                (started, executor, resolver),
+            ).lastrowid
+            self._connection.executemany(
+                "INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id,) + tuple(record) for record in records],
+            )
+        return run_id
+
+    def _get_recent_durations(self, runs):
+        durations = {}
+        for component, task, duration, _ in self._connection.execute(
+            _RECENT_DURATIONS, (runs,)
+        ):
+            durations.setdefault((component, task), []).append(duration)
+        return durations
+
+    def get_slowest(self, runs, limit):
+        """
+        Find the tasks with the longest average duration, slowest first.
+        Returns a list of ((component, task), average duration).
+
+        Arguments:
+        runs - the number of recent runs to consider
+        limit - the maximum number of tasks to return
+        """
+        recent_durations = self._get_recent_durations(runs)
+        averages = [
+            (component_task, sum(durations) / len(durations))
+            for component_task, durations in recent_durations.items()
+        ]
+        averages.sort(key=lambda average: average[1], reverse=True)
+        return averages[:limit]
+
+    def get_trend(self, component, task, runs):
+        """
+        Retrieve a task's results from recent runs, oldest first.  Returns a
+        list of (started, duration, outcome).
+
+        Arguments:
+        component - the component's name
+        task - the task's name
+        runs - the number of recent runs to include
+        """
+        rows = self._connection.execute(
+            "SELECT runs.started, tasks.duration, tasks.outcome FROM tasks "
+            "JOIN runs ON runs.id = tasks.run_id "
+            "WHERE tasks.component = ? AND tasks.task = ? "
+            "ORDER BY runs.id DESC LIMIT ?",
+            (component, task, runs),
+        ).fetchall()
+        rows.reverse()
+        return rows
+
+    def get_slower(self, runs, threshold):
+        """
+        Find tasks whose latest successful duration is longer than their
+        average over earlier runs.  Returns a list of ((component, task),
+        latest duration, earlier average), with the biggest slowdowns first.
+
+        Arguments:
+        runs - the number of recent runs to consider, including the latest
+        threshold - how many times slower than average a task must be
+        """
+        slower = []
+        for component_task, durations in self._get_recent_durations(runs).items():
+            if len(durations) > 1:
+                latest = durations[0]
+                average = sum(durations[1:]) / (len(durations) - 1)
+                if latest > average * threshold:
+                    slower.append((component_task, latest, average))
+        slower.sort(key=lambda result: result[1] / max(result[2], 1e-9), reverse=True)
+        return slower
+
+
+def record_run(full_config, started, executor, resolver, records):
+    """
+    Add a run to the history database in each component's configuration
+    directory.  Components without a configuration directory aren't recorded.
+
+    Arguments:
+    full_config - the full project configuration
+    started - when the run started, in seconds since the epoch
+    executor - the name of the executor used
+    resolver - the name of the dependency resolver used
+    records - a list of ((component, task), duration, outcome)
+    """
+    # pylint: disable=too-many-arguments
+    paths = {}
+    for (component, task), duration, outcome in records:
+        config = full_config.get(component)
+        if config is not None and config.get("dp.config_dir"):
+            path = devpipeline_core.paths.make_path(config, _HISTORY_FILE)
+            paths.setdefault(path, []).append(
+                (
+                    component,
+                    task,
+                    duration,
+                    outcome,
+                    devpipeline_core.fingerprint.config_fingerprint(config),
+                )
+            )
+    for path, path_records in paths.items():
+        history = BuildHistory(path)
+        try:
+            history.add_run(started, executor, resolver, path_records)
+        finally:
+            history.close()
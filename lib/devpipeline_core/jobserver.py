@@ -0,0 +1,194 @@
+#!/usr/bin/python3
+
+"""
+Share a budget of jobs with nested builds using GNU make's jobserver protocol.
+
+Every job needs a token.  Each process gets one token implicitly, and the
+rest are single bytes read from a shared pipe and written back once the job
+finishes.  make (4.4 and later) and ninja (1.13 and later) both take part
+when they find the jobserver in MAKEFLAGS.
+"""
+
+import os
+import os.path
+import re
+import select
+import shutil
+import tempfile
+
+_AUTH_PATTERN = re.compile(r"--jobserver-(?:auth|fds)=(\S+)")
+_PARALLEL_PATTERN = re.compile(
+    r"(?:^|\s)(?:-j\d*|--jobserver-(?:auth|fds)=\S+)(?=\s|$)"
+)
+
+
+def _open_fifo(path):
+    # Opening our own file descriptions means they can be made non-blocking
+    # without affecting anyone else using the fifo.
+    read_fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    write_fd = os.open(path, os.O_WRONLY)
+    return (read_fd, write_fd)
+
+
+def _without_jobserver(makeflags):
+    return _PARALLEL_PATTERN.sub("", makeflags).strip()
+
+
+def find_jobserver(environment):
+    """
+    Find the jobserver advertised in an environment's MAKEFLAGS.  Returns
+    the jobserver's authorization string (e.g., "fifo:/tmp/path" or "3,4"),
+    or None if there isn't one.
+
+    Arguments:
+    environment - a dictionary-like environment
+    """
+    match = _AUTH_PATTERN.search(environment.get("MAKEFLAGS", ""))
+    if match:
+        return match.group(1)
+    return None
+
+
+class JobServer:
+    """
+    A jobserver shared by this process and anything it runs.  Each task
+    acquires a token before it starts and releases it once it finishes.  The
+    first task always uses this process's implicit token, so a task can always
+    start when nothing else is running.
+    """
+
+    # nested builds return tokens without any of our tasks finishing
+    polls = True
+
+    def __init__(self, read_fd, write_fd, makeflags, fifo_dir=None):
+        # pylint: disable=too-many-arguments
+        self.makeflags = makeflags
+        self._read_fd = read_fd
+        self._write_fd = write_fd
+        self._fifo_dir = fifo_dir
+        self._implicit_free = True
+        self._spare = None
+        self._tokens = {}
+
+    @classmethod
+    def create(cls, jobs):
+        """
+        Create a new jobserver for a total of jobs concurrent jobs.
+
+        Arguments:
+        jobs - the number of jobs, including this process's implicit token
+        """
+        if not hasattr(os, "mkfifo"):
+            raise Exception("A jobserver isn't supported on this platform")
+        fifo_dir = tempfile.mkdtemp(prefix="dev-pipeline-jobserver-")
+        path = os.path.join(fifo_dir, "fifo")
+        os.mkfifo(path, 0o600)
+        read_fd, write_fd = _open_fifo(path)
+        os.write(write_fd, b"+" * (jobs - 1))
+        return cls(
+            read_fd,
+            write_fd,
+            "-j{} --jobserver-auth=fifo:{}".format(jobs, path),
+            fifo_dir,
+        )
+
+    @classmethod
+    def inherit(cls, environment):
+        """
+        Join the jobserver in an environment's MAKEFLAGS.  Returns None if
+        there isn't a jobserver or it isn't usable (e.g., make didn't pass the
+        pipe along because the command wasn't marked with +).
+
+        A jobserver passed as file descriptors isn't advertised to commands
+        run by tasks, since subprocess closes inherited descriptors; nested
+        builds run serially under their task's token instead.
+
+        Arguments:
+        environment - a dictionary-like environment
+        """
+        auth = find_jobserver(environment)
+        if auth is None:
+            return None
+        makeflags = environment["MAKEFLAGS"]
+        try:
+            if auth.startswith("fifo:"):
+                read_fd, write_fd = _open_fifo(auth[5:])
+            else:
+                read_fd, write_fd = [os.dup(int(fd)) for fd in auth.split(",")]
+                makeflags = _without_jobserver(makeflags)
+        except (OSError, ValueError):
+            return None
+        return cls(read_fd, write_fd, makeflags)
+
+    def _read_token(self):
+        # Inherited pipes can't be made non-blocking without changing them for
+        # every other process, so check first; losing a race to another
+        # process just means waiting for one of its jobs to finish.
+        readable, _, _ = select.select([self._read_fd], [], [], 0)
+        if not readable:
+            return None
+        try:
+            return os.read(self._read_fd, 1) or None
+        except BlockingIOError:
+            return None
+
+    def is_open(self, task_name):
+        """
+        Check whether a token is available, holding on to it for the next
+        task that's started.
+
+        Arguments:
+        task_name - the name of the task to start
+        """
+        del task_name
+        if self._implicit_free or self._spare is not None:
+            return True
+        self._spare = self._read_token()
+        return self._spare is not None
+
+    def unreserve(self):
+        """Give back a token held by is_open, since no task is starting."""
+        if self._spare is not None:
+            os.write(self._write_fd, self._spare)
+            self._spare = None
+
+    def acquire(self, component_task):
+        """
+        Try to get a token for a task, returning whether it can start.
+
+        Arguments:
+        component_task - the (component, task) to start
+        """
+        if self._implicit_free:
+            self._implicit_free = False
+            self._tokens[component_task] = None
+            return True
+        token = self._spare
+        self._spare = None
+        if token is None:
+            token = self._read_token()
+        if token is None:
+            return False
+        self._tokens[component_task] = token
+        return True
+
+    def release(self, component_task):
+        """
+        Return the token held by a task.
+
+        Arguments:
+        component_task - the (component, task) that finished
+        """
+        token = self._tokens.pop(component_task)
+        if token is None:
+            self._implicit_free = True
+        else:
+            os.write(self._write_fd, token)
+
+    def close(self):
+        """Stop using the jobserver, removing it if this process created it."""
+        self.unreserve()
+        os.close(self._read_fd)
+        os.close(self._write_fd)
+        if self._fifo_dir is not None:
+            shutil.rmtree(self._fifo_dir, ignore_errors=True)
@@ -4,19 +4,190 @@
 Handle loading dev-pipeline plugins.
 """
 
-import pkg_resources
+import collections.abc
+import importlib
+import os
+import os.path
+import sys
+import time
+
+import devpipeline_core.statefile
+
+_INDEX_VERSION = 1
+_METADATA_SUFFIXES = (".dist-info", ".egg-info")
+
+
+def _get_index_path():
+    cache_root = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_root, "dev-pipeline", "entry-points.json")
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _metadata_stamp():
+    # Installing, removing, or upgrading a distribution changes the set of
+    # metadata directories or their modification times; editing entry points
+    # in place changes entry_points.txt.
+    stamp = [sys.path]
+    for path in sys.path:
+        try:
+            names = sorted(os.listdir(path or "."))
+        except OSError:
+            continue
+        for name in names:
+            if name.endswith(_METADATA_SUFFIXES):
+                metadata_dir = os.path.join(path, name)
+                stamp.append(
+                    [
+                        metadata_dir,
+                        _get_mtime(metadata_dir),
+                        _get_mtime(os.path.join(metadata_dir, "entry_points.txt")),
+                    ]
+                )
+    return stamp
+
+
+def _discover_entry_points():
+    # importlib.metadata is slow to import, so only pay for it when needed
+    import importlib.metadata  # pylint: disable=import-outside-toplevel
+
+    groups = {}
+    for distribution in importlib.metadata.distributions():
+        for entry_point in distribution.entry_points:
+            # the first distribution on sys.path shadows any later ones
+            group = groups.setdefault(entry_point.group, {})
+            group.setdefault(entry_point.name, entry_point.value)
+    return groups
+
+
+class _EntryPointIndex:
+    """
+    Every entry point group, name, and target for installed distributions.
+
+    The index is saved to the user's cache directory and reused until the
+    installed distributions' metadata changes, so most runs don't need to read
+    any distribution metadata.
+    """
+
+    def __init__(self):
+        self._groups = None
+        self.from_cache = False
+        self.discovery_time = None
+
+    def _load(self):
+        start = time.perf_counter()
+        index_path = _get_index_path()
+        stamp = _metadata_stamp()
+        cached = devpipeline_core.statefile.load_state(index_path)
+        if cached.get("version") == _INDEX_VERSION and cached.get("stamp") == stamp:
+            self._groups = cached["groups"]
+            self.from_cache = True
+        else:
+            self._groups = _discover_entry_points()
+            try:
+                devpipeline_core.statefile.write_state(
+                    index_path,
+                    {"version": _INDEX_VERSION, "stamp": stamp, "groups": self._groups},
+                )
+            except OSError:
+                # an unwritable cache only costs time
+                pass
+        self.discovery_time = time.perf_counter() - start
+
+    def get_groups(self):
+        if self._groups is None:
+            self._load()
+        return self._groups
+
+
+_INDEX = _EntryPointIndex()
+
+
+def _find_entry_points(entry_point_name):
+    return _INDEX.get_groups().get(entry_point_name, {})
+
+
+def _load_entry_point(target):
+    # targets look like "module.name:attribute.name [extras]"
+    module_name, _, attributes = target.partition(":")
+    plugin = importlib.import_module(module_name.strip())
+    attributes = attributes.split("[")[0].strip()
+    if attributes:
+        for attribute in attributes.split("."):
+            plugin = getattr(plugin, attribute)
+    return plugin
+
+
+class _LazyPlugins(collections.abc.Mapping):
+    """
+    A read-only dictionary of plugins.  Entry points aren't discovered until
+    the dictionary is first used, and each plugin is only imported the first
+    time it's looked up.
+    """
+
+    def __init__(self, entry_point_name):
+        self._entry_point_name = entry_point_name
+        self._entry_points = None
+        self._plugins = {}
+
+    def _get_entry_points(self):
+        if self._entry_points is None:
+            self._entry_points = _find_entry_points(self._entry_point_name)
+        return self._entry_points
+
+    def __getitem__(self, name):
+        if name not in self._plugins:
+            self._plugins[name] = _load_entry_point(self._get_entry_points()[name])
+        return self._plugins[name]
+
+    def __contains__(self, name):
+        return name in self._get_entry_points()
+
+    def __iter__(self):
+        return iter(self._get_entry_points())
+
+    def __len__(self):
+        return len(self._get_entry_points())
+
+    def get_target(self, name):
+        """Retrieve the import target of a plugin without loading it."""
+        return self._get_entry_points()[name]
 
 
 def query_plugins(entry_point_name):
     """
     Find everything with a specific entry_point.  Results will be returned as a
-    dictionary, with the name as the key and the entry_point itself as the
-    value.
+    dictionary-like object, with the name as the key and the entry_point itself
+    as the value.  Plugins are only loaded when they're retrieved.
 
     Arguments:
     entry_point_name - the name of the entry_point to populate
     """
-    entries = {}
-    for entry_point in pkg_resources.iter_entry_points(entry_point_name):
-        entries[entry_point.name] = entry_point.load()
-    return entries
+    return _LazyPlugins(entry_point_name)
+
+
+def query_groups(prefix):
+    """
+    Find the names of every entry_point group that starts with prefix.
+
+    Arguments:
+    prefix - the prefix of the group names to find (e.g., "devpipeline.")
+    """
+    return sorted(group for group in _INDEX.get_groups() if group.startswith(prefix))
+
+
+def get_discovery_info():
+    """
+    Retrieve how long it took to find entry points and whether the cached
+    index was used, as a tuple.  Entry points are found if they haven't been
+    already.
+    """
+    _INDEX.get_groups()
+    return (_INDEX.discovery_time, _INDEX.from_cache)
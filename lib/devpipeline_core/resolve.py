@@ -1,6 +1,9 @@
 #!/usr/bin/python3
 """Resolve dependencies into an order build list"""
 
+import collections
+import weakref
+
 import devpipeline_core.taskqueue
 
 
@@ -14,7 +17,12 @@ class CircularDependencyException(Exception):
         self.components = circular_components
 
     def __str__(self):
-        return "Circular dependency: {}".format(self.components)
+        return "Circular dependency: {}".format(
+            "; ".join(
+                ", ".join("{} ({})".format(*member) for member in cycle)
+                for cycle in self.components
+            )
+        )
 
 
 class MissingComponentsException(Exception):
@@ -26,14 +34,76 @@ class MissingComponentsException(Exception):
         return "Missing component configurations: {}".format(self.missing_components)
 
 
-def _process_none(targets, components, tasks):
+def _find_cycles(dep_manager):
+    # Tarjan's strongly connected components algorithm, using an explicit
+    # stack so deep dependency chains can't exhaust the recursion limit.
+    indices = {}
+    lowlinks = {}
+    component_stack = []
+    on_stack = {}
+    cycles = []
+
+    def _visit(component_task):
+        indices[component_task] = len(indices)
+        lowlinks[component_task] = indices[component_task]
+        component_stack.append(component_task)
+        on_stack[component_task] = None
+        return (component_task, iter(dep_manager.get_dependencies(component_task)))
+
+    def _pop_component(root):
+        members = []
+        member = None
+        while member != root:
+            member = component_stack.pop()
+            del on_stack[member]
+            members.append(member)
+        if len(members) > 1 or root in dep_manager.get_dependencies(root):
+            cycles.append(sorted(members))
+
+    for start in dep_manager.get_tasks():
+        if start in indices:
+            continue
+        to_visit = [_visit(start)]
+        while to_visit:
+            component_task, dependencies = to_visit[-1]
+            for dependency in dependencies:
+                if dependency not in indices:
+                    to_visit.append(_visit(dependency))
+                    break
+                if dependency in on_stack:
+                    lowlinks[component_task] = min(
+                        lowlinks[component_task], indices[dependency]
+                    )
+            else:
+                to_visit.pop()
+                if to_visit:
+                    parent = to_visit[-1][0]
+                    lowlinks[parent] = min(lowlinks[parent], lowlinks[component_task])
+                if lowlinks[component_task] == indices[component_task]:
+                    _pop_component(component_task)
+    return cycles
+
+
+def _check_cycles(dep_manager):
+    cycles = _find_cycles(dep_manager)
+    if cycles:
+        raise CircularDependencyException(cycles)
+    return dep_manager
+
+
+def _process_none(
+    targets,
+    components,
+    tasks,
+    manager_type=devpipeline_core.taskqueue.DependencyManager,
+):
     del components
 
-    dep_manager = devpipeline_core.taskqueue.DependencyManager(tasks)
+    dep_manager = manager_type(tasks)
     for target in targets:
         for task in tasks:
             dep_manager.add_dependency((target, task), None)
-    return dep_manager
+    return _check_cycles(dep_manager)
 
 
 _NONE_RESOLVER = (
@@ -75,8 +145,8 @@ def _handle_component_dependencies(component, component_task, dep_manager):
     return component_dependencies
 
 
-def calculate_dependencies(targets, full_config, tasks):
-    dep_manager = devpipeline_core.taskqueue.DependencyManager(tasks)
+def _build_dependencies(targets, full_config, tasks, manager_type):
+    dep_manager = manager_type(tasks)
     to_process, known_targets = _build_target_tasks(targets, tasks)
     missing_components = []
     while to_process:
@@ -99,30 +169,85 @@ def calculate_dependencies(targets, full_config, tasks):
     return dep_manager
 
 
+def calculate_dependencies(
+    targets,
+    full_config,
+    tasks,
+    manager_type=devpipeline_core.taskqueue.DependencyManager,
+):
+    return _check_cycles(_build_dependencies(targets, full_config, tasks, manager_type))
+
+
 _DEEP_RESOLVER = (
     calculate_dependencies,
     "A resolver that includes the entire dependency tree for every target.",
 )
 
 
-def _process_reverse(targets, components, tasks):
-    to_process = list(targets)
-    known_targets = {target: None for target in targets}
-    full_dm = calculate_dependencies(components.keys(), components, tasks)
-    dep_manager = devpipeline_core.taskqueue.DependencyManager(tasks)
+_DEPENDS_PREFIX = "depends."
+
+# reverse dependency indexes are only valid for the configuration they were
+# built from, so they're discarded along with it
+_REVERSE_INDEXES = weakref.WeakKeyDictionary()
+
+
+def _build_reverse_index(components):
+    reverse_index = {}
+    for name in components.keys():
+        component = components.get(name)
+        for key in component:
+            if key.startswith(_DEPENDS_PREFIX):
+                task = key[len(_DEPENDS_PREFIX) :]
+                for dependency in component.get_list(key):
+                    if dependency:
+                        reverse_index.setdefault((dependency, task), []).append(name)
+    return reverse_index
+
+
+def _get_reverse_index(components):
+    """
+    Find the components that directly depend on each (component, task).  The
+    index is built with a single pass over the configuration and reused for
+    as long as the configuration exists.
+    """
+    try:
+        reverse_index = _REVERSE_INDEXES.get(components)
+    except TypeError:
+        # the configuration can't be weakly referenced, so it can't be cached
+        return _build_reverse_index(components)
+    if reverse_index is None:
+        reverse_index = _build_reverse_index(components)
+        _REVERSE_INDEXES[components] = reverse_index
+    return reverse_index
+
+
+def _process_reverse(
+    targets,
+    components,
+    tasks,
+    manager_type=devpipeline_core.taskqueue.DependencyManager,
+):
+    missing_components = [
+        target for target in targets if components.get(target) is None
+    ]
+    if missing_components:
+        raise MissingComponentsException(missing_components)
+
+    reverse_index = _get_reverse_index(components)
+    dep_manager = manager_type(tasks)
+    to_process = collections.deque(targets)
+    known_targets = dict.fromkeys(targets)
     while to_process:
-        target = to_process[0]
+        target = to_process.popleft()
         for task in tasks:
             component_task = (target, task)
-            if target in targets:
-                dep_manager.add_dependency(component_task, None)
-            for reverse_dependent in full_dm.get_reverse_dependencies(component_task):
-                dep_manager.add_dependency(reverse_dependent, component_task)
-                if reverse_dependent[0] not in known_targets:
-                    known_targets[reverse_dependent[0]] = None
-                    to_process.append(reverse_dependent[0])
-        to_process.pop(0)
-    return dep_manager
+            dep_manager.add_dependency(component_task, None)
+            for reverse_dependent in reverse_index.get(component_task, []):
+                dep_manager.add_dependency((reverse_dependent, task), component_task)
+                if reverse_dependent not in known_targets:
+                    known_targets[reverse_dependent] = None
+                    to_process.append(reverse_dependent)
+    return _check_cycles(dep_manager)
 
 
 _REVERSE_RESOLVER = (
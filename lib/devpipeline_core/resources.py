@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+
+"""
+Limit which tasks run together based on the resources they need.
+
+Components declare what each task needs with resources.<task>.<resource>
+keys (e.g., resources.build.cpu = 8 and resources.build.memory = 16G).  Tasks
+that don't declare anything need one CPU and no memory.
+"""
+
+import os
+import re
+import threading
+
+_DEFAULT_COSTS = {"cpu": 1.0, "memory": 0.0}
+_SIZE_PATTERN = re.compile(r"^\s*([0-9]*\.?[0-9]+)\s*([kmgt]?)i?b?\s*$", re.IGNORECASE)
+_SIZE_SCALES = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+
+def parse_size(value):
+    """
+    Convert a size (e.g., "512M" or "16G") to a number of bytes.
+
+    Arguments:
+    value - the size
+    """
+    match = _SIZE_PATTERN.match(str(value))
+    if not match:
+        raise Exception("{} isn't a valid size".format(value))
+    return float(match.group(1)) * _SIZE_SCALES[match.group(2).lower()]
+
+
+_PARSERS = {"cpu": float, "memory": parse_size}
+
+
+def get_host_budget():
+    """Find the CPUs and memory available on this machine."""
+    budget = {"cpu": float(os.cpu_count() or 1)}
+    try:
+        budget["memory"] = float(
+            os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        )
+    except (AttributeError, ValueError, OSError):
+        # without a way to know, don't limit memory
+        budget["memory"] = float("inf")
+    return budget
+
+
+class ResourceGate:
+    """
+    Only let a task start if what it needs fits in what's left of a budget.
+    A task that needs more than the entire budget can still run, but only by
+    itself.
+    """
+
+    def __init__(self, full_config, budget):
+        self._full_config = full_config
+        self.budget = budget
+        self._used = {resource: 0.0 for resource in budget}
+        self._held = {}
+        self._lock = threading.Lock()
+
+    def get_costs(self, component_task):
+        """
+        Retrieve the resources a task needs.
+
+        Arguments:
+        component_task - the (component, task)
+        """
+        component, task = component_task
+        config = self._full_config.get(component)
+        costs = {}
+        for resource in self.budget:
+            value = None
+            if config is not None:
+                value = config.get("resources.{}.{}".format(task, resource))
+            if value:
+                try:
+                    costs[resource] = _PARSERS[resource](value)
+                except ValueError:
+                    raise Exception(
+                        "{} isn't a valid {} cost for {}".format(
+                            value, resource, component
+                        )
+                    )
+            else:
+                costs[resource] = _DEFAULT_COSTS[resource]
+        return costs
+
+    def acquire(self, component_task):
+        """
+        Reserve a task's resources if they fit, returning whether they did.
+
+        Arguments:
+        component_task - the (component, task) to start
+        """
+        costs = self.get_costs(component_task)
+        with self._lock:
+            if self._held and any(
+                self._used[resource] + cost > self.budget[resource]
+                for resource, cost in costs.items()
+            ):
+                return False
+            for resource, cost in costs.items():
+                self._used[resource] += cost
+            self._held[component_task] = costs
+            return True
+
+    def release(self, component_task):
+        """
+        Return a task's resources to the budget.
+
+        Arguments:
+        component_task - the (component, task) that finished
+        """
+        with self._lock:
+            for resource, cost in self._held.pop(component_task).items():
+                self._used[resource] -= cost
@@ -2,9 +2,14 @@
 
 """Code related to project sanitization."""
 
+import concurrent.futures
+import hashlib
+import json
 import re
 
 import devpipeline_core.plugin
+import devpipeline_core.statefile
+import devpipeline_core.version
 
 _DEPENDS_KEY_PATTERN = re.compile(r"^depends\..+")
 
@@ -13,61 +18,218 @@ def _get_depends_keys(configuration):
     return [key for key in configuration.keys() if _DEPENDS_KEY_PATTERN.match(key)]
 
 
-def _sanitize_empty_depends(configuration, error_fn):
-    for name, component in configuration.items():
-        depends_keys = _get_depends_keys(component)
-        for depends_key in depends_keys:
-            for dep in component.get_list(depends_key):
-                if not dep:
-                    error_fn("Empty dependency in {}:{}".format(name, depends_key))
+def _get_raw_values(component):
+    return {key: component.get(key, raw=True) for key in component}
 
 
+class ComponentIndex:
+    """
+    Everything sanitizers need to know about a single component, gathered in
+    one pass over its configuration: raw values, the keys that declare
+    dependencies, and the parsed dependencies of each.  Indexes only contain
+    plain data, so they can be sent to other processes.
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, name, component, raw_values=None):
+        self.name = name
+        self.raw_values = raw_values
+        if raw_values is None:
+            self.raw_values = _get_raw_values(component)
+        self.depends_keys = _get_depends_keys(self.raw_values)
+        self.depends = {key: component.get_list(key) for key in self.depends_keys}
+        self.all_depends = set()
+        for dependencies in self.depends.values():
+            self.all_depends.update(dependencies)
+
+
+def per_component(check_fn):
+    """
+    Turn a check of a single component into a sanitizer.  The check takes a
+    ComponentIndex and an error function; sanitize will run every such check
+    in a single pass over the configuration, but the sanitizer can also be
+    called directly like any other.
+
+    Arguments:
+    check_fn - the check to run against each component
+    """
+
+    def _sanitize(configuration, error_fn):
+        for name, component in configuration.items():
+            check_fn(ComponentIndex(name, component), error_fn)
+
+    _sanitize.check_component = check_fn
+    return _sanitize
+
+
+def _check_empty_depends(index, error_fn):
+    for depends_key in index.depends_keys:
+        for dep in index.depends[depends_key]:
+            if not dep:
+                error_fn("Empty dependency in {}:{}".format(index.name, depends_key))
+
+
+_sanitize_empty_depends = per_component(_check_empty_depends)
+
 _IMPLICIT_PATTERN = re.compile(r"\$\{([a-z_\-0-9\.]+):.+\}")
 
 
-def _check_implicit_depends(component, depends_keys, key, error_fn):
-    val = component.get(key, raw=True)
-    match = _IMPLICIT_PATTERN.search(val)
-    if match:
-        dep = match.group(1)
-        for depends_key in depends_keys:
-            if dep in component.get_list(depends_key):
-                return None
-        # not found in any of the depends keys
-        error_fn(
-            "{}:{} has an implicit dependency on {}".format(component.name, key, dep)
-        )
-    return None
+def _check_implicit_depends(index, error_fn):
+    for key, val in index.raw_values.items():
+        match = _IMPLICIT_PATTERN.search(val)
+        if match:
+            dep = match.group(1)
+            if dep not in index.all_depends:
+                # not found in any of the depends keys
+                error_fn(
+                    "{}:{} has an implicit dependency on {}".format(
+                        index.name, key, dep
+                    )
+                )
+
+
+_sanitize_implicit_depends = per_component(_check_implicit_depends)
 
 
-def _sanitize_implicit_depends(configuration, error_fn):
-    for name, component in configuration.items():
-        del name
-        depends_keys = _get_depends_keys(component)
-        for key in component:
-            _check_implicit_depends(component, depends_keys, key, error_fn)
+def _check_legacy_depends(index, error_fn):
+    if "depends" in index.raw_values:
+        if not index.depends_keys:
+            error_fn("{} uses a deprecated key (depends)".format(index.name))
 
 
-def _sanitize_legacy_depends(configuration, error_fn):
-    for name, component in configuration.items():
-        if "depends" in component:
-            if not _get_depends_keys(component):
-                error_fn("{} uses a deprecated key (depends)".format(name))
+_sanitize_legacy_depends = per_component(_check_legacy_depends)
 
 
 _SANITIZERS = devpipeline_core.plugin.query_plugins("devpipeline.config_sanitizers")
 
 
-def sanitize(configuration, error_fn):
+def _check_components(checks, indexes):
+    # Returns, for each component, the warnings from each check.
+    results = []
+    for index in indexes:
+        warnings = []
+        for check_fn in checks:
+            check_warnings = []
+            check_fn(index, check_warnings.append)
+            warnings.append(check_warnings)
+        results.append(warnings)
+    return results
+
+
+def _chunk(items, size):
+    return [items[start : start + size] for start in range(0, len(items), size)]
+
+
+def _run_checks(checks, indexes, jobs):
+    if jobs <= 1 or len(indexes) < 2:
+        return _check_components(checks, indexes)
+    chunks = _chunk(indexes, max(1, len(indexes) // (jobs * 4)))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = []
+        for chunk_results in pool.map(
+            _check_components, [checks] * len(chunks), chunks
+        ):
+            results.extend(chunk_results)
+        return results
+
+
+_RESULTS_FILE = "sanitizer-results.json"
+
+
+def _referenced_components(raw_values):
+    referenced = set()
+    for key in _get_depends_keys(raw_values):
+        referenced.update(dep.strip() for dep in str(raw_values[key]).split(","))
+    return sorted(referenced)
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def _check_incremental(configuration, components, check_names, checks, jobs):
+    # pylint: disable=too-many-arguments,too-many-locals
+    raw_values = {name: _get_raw_values(component) for name, component in components}
+    raw_digests = {name: _digest(values) for name, values in raw_values.items()}
+    saved = devpipeline_core.statefile.ComponentState(configuration, _RESULTS_FILE)
+
+    results = [None] * len(components)
+    stale = []
+    for position, (name, component) in enumerate(components):
+        # a component's results can only change if its own configuration, the
+        # configuration of something it depends on, or the checks change
+        digest = _digest(
+            [
+                devpipeline_core.version.STRING,
+                check_names,
+                raw_digests[name],
+                [
+                    (dep, raw_digests.get(dep))
+                    for dep in _referenced_components(raw_values[name])
+                ],
+            ]
+        )
+        component_results = saved.get(name)
+        if component_results.get("digest") == digest:
+            results[position] = component_results["warnings"]
+        else:
+            component_results.clear()
+            component_results["digest"] = digest
+            stale.append((position, ComponentIndex(name, component, raw_values[name])))
+
+    checked = _run_checks(checks, [index for _, index in stale], jobs)
+    for (position, index), warnings in zip(stale, checked):
+        results[position] = warnings
+        saved.get(index.name)["warnings"] = warnings
+    if stale:
+        saved.write()
+    return results
+
+
+def sanitize(configuration, error_fn, jobs=1, incremental=False):
     """
     Run all availalbe sanitizers across a configuration.
 
+    Sanitizers created with per_component share a single pass over the
+    configuration, and with more than one job their checks are spread across a
+    pool of processes.  Warnings are reported in the same order either way.
+
     Arguments:
     configuration - a full project configuration
     error_fn - A function to call if a sanitizer check fails.  The function
                takes a single argument: a description of the problem; provide
                specifics if possible, including the componnet, the part of the
                configuration that presents an issue, etc..
+    jobs - the number of processes to check components with
+    incremental - whether to reuse results from the previous run
     """
-    for name, sanitize_fn in _SANITIZERS.items():
-        sanitize_fn(configuration, lambda warning, n=name: error_fn(n, warning))
+    sanitizers = list(_SANITIZERS.items())
+    check_names = []
+    checks = []
+    for name, sanitize_fn in sanitizers:
+        if hasattr(sanitize_fn, "check_component"):
+            check_names.append(name)
+            checks.append(sanitize_fn.check_component)
+    results = []
+    if checks:
+        components = list(configuration.items())
+        if incremental:
+            results = _check_incremental(
+                configuration, components, check_names, checks, jobs
+            )
+        else:
+            indexes = [
+                ComponentIndex(name, component) for name, component in components
+            ]
+            results = _run_checks(checks, indexes, jobs)
+
+    check_number = 0
+    for name, sanitize_fn in sanitizers:
+        if hasattr(sanitize_fn, "check_component"):
+            for component_results in results:
+                for warning in component_results[check_number]:
+                    error_fn(name, warning)
+            check_number += 1
+        else:
+            sanitize_fn(configuration, lambda warning, n=name: error_fn(n, warning))
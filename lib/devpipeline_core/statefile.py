@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+
+"""Persistent state that's kept alongside a project's configuration."""
+
+import json
+import os
+import os.path
+
+import devpipeline_core.paths
+
+
+def load_state(path):
+    """
+    Load JSON state from a file.  Missing or damaged files are treated as
+    empty state.
+    """
+    try:
+        with open(path) as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_state(path, state):
+    """
+    Atomically replace a file with JSON state, creating its directory if
+    required.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = "{}.tmp".format(path)
+    with open(temp_path, "w") as state_file:
+        json.dump(state, state_file, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+class ComponentState:
+    """
+    Per-component state persisted as JSON in each component's configuration
+    directory.
+
+    Components that share a configuration directory share a single file, so in
+    the common case the state for an entire project is a single read and
+    write.  Components without a configuration directory get state that only
+    lives as long as this object.
+    """
+
+    def __init__(self, full_config, filename):
+        self._full_config = full_config
+        self._filename = filename
+        self._files = {}
+        self._component_paths = {}
+
+    def _get_path(self, component):
+        if component not in self._component_paths:
+            config = self._full_config.get(component)
+            path = None
+            if config is not None and config.get("dp.config_dir"):
+                path = devpipeline_core.paths.make_path(config, self._filename)
+            self._component_paths[component] = path
+        return self._component_paths[component]
+
+    def get(self, component):
+        """
+        Retrieve the state for a component.  The returned dictionary can be
+        modified and changes will be saved by write.
+
+        Arguments:
+        component - the name of the component
+        """
+        path = self._get_path(component)
+        if path not in self._files:
+            self._files[path] = load_state(path) if path else {}
+        return self._files[path].setdefault(component, {})
+
+    def write(self):
+        """Save the state of every component that's been accessed."""
+        for path, state in self._files.items():
+            if path:
+                write_state(path, state)
@@ -1,44 +1,132 @@
 #!/usr/bin/python3
 
-import copy
+import array
+import collections.abc
+import heapq
+import itertools
+
+
+def _no_priority(task):
+    del task
+    return 0
 
 
 class _TaskQueue:
-    def __init__(self, dependencies, reverse_dependencies):
-        self._dependencies = copy.deepcopy(dependencies)
-        self._reverse_dependencies = copy.deepcopy(reverse_dependencies)
+    def __init__(self, dependencies, reverse_dependencies, priority_fn=None):
+        # Only the reverse dependencies need to be consulted after this point,
+        # and they're never modified; track how many dependencies each task is
+        # still waiting on instead of copying the graph.
+        self._reverse_dependencies = reverse_dependencies
+        self._priority_fn = priority_fn or _no_priority
+        self._sequence = itertools.count()
+        self._remaining = {}
+        # each task name gets its own ready heap, so callers can take tasks of
+        # one kind without looking at every other ready task
+        self._ready = {}
+        for task, task_dependencies in dependencies.items():
+            self._remaining[task] = len(task_dependencies)
+            if not task_dependencies:
+                self._push_ready(task)
+
+    def _push_ready(self, task):
+        # Highest priority first; ties are broken by the order tasks became
+        # ready.
+        heapq.heappush(
+            self._ready.setdefault(task[1], []),
+            (-self._priority_fn(task), next(self._sequence), task),
+        )
+
+    def _get_top(self, heap):
+        # tasks that failed before being handed out are left in the heap
+        while heap and heap[0][2] not in self._remaining:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
 
     def _get_ready_tasks(self):
         next_tasks = []
-        for component, dependencies in self._dependencies.items():
-            if not dependencies:
-                next_tasks.append(component)
+        task = self.pop_ready()
+        while task is not None:
+            next_tasks.append(task)
+            task = self.pop_ready()
         return next_tasks
 
     def __iter__(self):
-        while self._dependencies:
+        while self._remaining:
             next_tasks = self._get_ready_tasks()
             if next_tasks:
                 yield next_tasks
             else:
                 raise Exception("Resolve failure")
 
+    def __len__(self):
+        return len(self._remaining)
+
+    def pop_ready(self, accept=None, is_open=None):
+        """
+        Retrieve the highest priority task that's ready to execute, or None if
+        no tasks are ready.  A task is only returned once; callers must
+        eventually call resolve or fail with the returned task.
+
+        Arguments:
+        accept - an optional function that takes a ready task and returns
+                 whether it can be started; tasks it rejects stay ready
+        is_open - an optional function that takes a task name and returns
+                  whether tasks with that name can be started; ready tasks
+                  with other names aren't considered at all
+        """
+        # Empty heaps are skipped before asking is_open, which might reserve
+        # something (e.g., a jobserver token) for a task that doesn't exist.
+        heaps = [
+            heap
+            for task_name, heap in self._ready.items()
+            if self._get_top(heap) is not None
+            and (is_open is None or is_open(task_name))
+        ]
+        rejected = []
+        task = None
+        while task is None:
+            best_heap = None
+            best_entry = None
+            for heap in heaps:
+                entry = self._get_top(heap)
+                if entry is not None and (best_entry is None or entry < best_entry):
+                    best_heap = heap
+                    best_entry = entry
+            if best_heap is None:
+                break
+            heapq.heappop(best_heap)
+            if accept is None or accept(best_entry[2]):
+                task = best_entry[2]
+            else:
+                rejected.append((best_heap, best_entry))
+        for heap, entry in rejected:
+            heapq.heappush(heap, entry)
+        return task
+
     def resolve(self, task):
-        del self._dependencies[task]
+        del self._remaining[task]
         for reverse in self._reverse_dependencies[task]:
-            del self._dependencies[reverse][task]
+            if reverse in self._remaining:
+                self._remaining[reverse] -= 1
+                if not self._remaining[reverse]:
+                    self._push_ready(reverse)
 
     def fail(self, task):
-        local_skipped = []
-        for dep in self._dependencies[task]:
-            del self._reverse_dependencies[dep][task]
-        for reverse in self._reverse_dependencies[task]:
-            local_skipped.append(reverse)
+        """
+        Mark a task as failed.  Everything that depends on it, directly or
+        indirectly, is skipped.  The skipped tasks are returned without
+        duplicates; tasks already skipped by an earlier failure aren't
+        included.
+        """
+        del self._remaining[task]
         skipped = []
-        for skipped_task in local_skipped:
-            skipped.append(skipped_task)
-            skipped.extend(self.fail(skipped_task))
-        del self._dependencies[task]
+        to_skip = [task]
+        while to_skip:
+            for reverse in self._reverse_dependencies[to_skip.pop()]:
+                if reverse in self._remaining:
+                    del self._remaining[reverse]
+                    skipped.append(reverse)
+                    to_skip.append(reverse)
         return skipped
 
 
@@ -56,18 +144,40 @@ def _add_implicit(last_task, task_tuple, dependencies, reverse_dependencies):
 
 
 def _fill_implicit(component_task, task_list, dependencies, reverse_dependencies):
+    # task_list should end with component_task's task
     last_task = None
-    task_index = task_list.index(component_task[1]) + 1
-    for task in task_list[0:task_index]:
+    for task in task_list:
         task_tuple = (component_task[0], task)
         if task_tuple not in dependencies:
             _add_implicit(last_task, task_tuple, dependencies, reverse_dependencies)
         last_task = task
 
 
+def _critical_paths(dependencies, reverse_dependencies, weight_fn):
+    path_weights = {}
+    waiting = {}
+    to_process = []
+    for task, task_reverse_dependencies in reverse_dependencies.items():
+        waiting[task] = len(task_reverse_dependencies)
+        if not task_reverse_dependencies:
+            to_process.append(task)
+    while to_process:
+        task = to_process.pop()
+        heaviest = 0
+        for reverse in reverse_dependencies[task]:
+            heaviest = max(heaviest, path_weights[reverse])
+        path_weights[task] = weight_fn(task) + heaviest
+        for dependency in dependencies[task]:
+            waiting[dependency] -= 1
+            if not waiting[dependency]:
+                to_process.append(dependency)
+    return path_weights
+
+
 class DependencyManager:
     def __init__(self, tasks):
         self._tasks = tasks.copy()
+        self._task_ends = {task: index + 1 for index, task in enumerate(tasks)}
         self._dependencies = {}
         self._reverse_dependencies = {}
 
@@ -75,11 +185,14 @@ class DependencyManager:
         if component_task not in self._dependencies:
             _fill_implicit(
                 component_task,
-                self._tasks,
+                self._tasks[: self._task_ends[component_task[1]]],
                 self._dependencies,
                 self._reverse_dependencies,
             )
 
+    def get_tasks(self):
+        return self._dependencies.keys()
+
     def get_dependencies(self, component_task):
         return self._dependencies.get(component_task).keys()
 
@@ -96,5 +209,194 @@ class DependencyManager:
             _helper(component_task, dependent_task, self._dependencies)
             _helper(dependent_task, component_task, self._reverse_dependencies)
 
-    def get_queue(self):
-        return _TaskQueue(self._dependencies, self._reverse_dependencies)
+    def get_critical_paths(self, weight_fn):
+        """
+        Calculate the weight of the heaviest path from each task to any task
+        nothing depends on, including the task itself.  Tasks that are part of
+        a dependency cycle aren't included.
+
+        Arguments:
+        weight_fn - a function that takes a (component, task) tuple and returns
+                    its weight (e.g., an expected duration)
+        """
+        return _critical_paths(
+            self._dependencies, self._reverse_dependencies, weight_fn
+        )
+
+    def get_queue(self, priority_fn=None):
+        """
+        Create a queue to process tasks in dependency order.
+
+        Arguments:
+        priority_fn - an optional function that takes a (component, task) tuple
+                      and returns a number; when several tasks are ready, the
+                      tasks with the highest priority are provided first.
+        """
+        return _TaskQueue(self._dependencies, self._reverse_dependencies, priority_fn)
+
+
+def _build_adjacency(sources, targets, node_count):
+    # Build compressed sparse rows: the neighbors of node n are
+    # adjacent[offsets[n]:offsets[n + 1]], in the order they were added and
+    # without duplicates.
+    starts = array.array("l", [0]) * (node_count + 1)
+    for source in sources:
+        starts[source + 1] += 1
+    for node in range(node_count):
+        starts[node + 1] += starts[node]
+    fill = starts[:-1]
+    adjacent = array.array("l", [0]) * len(sources)
+    for source, target in zip(sources, targets):
+        adjacent[fill[source]] = target
+        fill[source] += 1
+    offsets = array.array("l", [0])
+    unique = array.array("l")
+    for node in range(node_count):
+        unique.extend(dict.fromkeys(adjacent[starts[node] : starts[node + 1]]))
+        offsets.append(len(unique))
+    return (offsets, unique)
+
+
+class _CompactView(collections.abc.Mapping):
+    """A read-only, dictionary-like view of a CompactDependencyManager."""
+
+    def __init__(self, tasks, lookup_fn):
+        self._tasks = tasks
+        self._lookup_fn = lookup_fn
+
+    def __getitem__(self, component_task):
+        return self._lookup_fn(component_task)
+
+    def __iter__(self):
+        return iter(self._tasks())
+
+    def __len__(self):
+        return len(self._tasks())
+
+
+class CompactDependencyManager:
+    """
+    A DependencyManager that stores its graph in flat integer arrays.
+
+    Component names are interned and every (component, task) pair is
+    identified by a single integer, so memory use grows with the number of
+    explicit dependencies rather than with the number of tuples and
+    dictionaries.  Implicit dependencies between a component's tasks aren't
+    stored at all.  The interface is the same as DependencyManager, but
+    (component, task) tuples are only created when they're requested.
+    """
+
+    def __init__(self, tasks):
+        self._tasks = tasks.copy()
+        self._task_ids = {task: task_id for task_id, task in enumerate(tasks)}
+        self._component_ids = {}
+        self._components = []
+        # each component's tasks are always a prefix of the task list
+        self._task_counts = array.array("l")
+        self._sources = array.array("l")
+        self._targets = array.array("l")
+        self._adjacency = None
+
+    def _add_node(self, component_task):
+        component_id = self._component_ids.get(component_task[0])
+        if component_id is None:
+            component_id = len(self._components)
+            self._component_ids[component_task[0]] = component_id
+            self._components.append(component_task[0])
+            self._task_counts.append(0)
+        task_id = self._task_ids[component_task[1]]
+        if self._task_counts[component_id] <= task_id:
+            self._task_counts[component_id] = task_id + 1
+            self._adjacency = None
+        return component_id * len(self._tasks) + task_id
+
+    def _find_node(self, component_task):
+        component_id = self._component_ids.get(component_task[0])
+        task_id = self._task_ids.get(component_task[1])
+        if (
+            component_id is None
+            or task_id is None
+            or task_id >= self._task_counts[component_id]
+        ):
+            raise KeyError(component_task)
+        return component_id * len(self._tasks) + task_id
+
+    def _make_task(self, node):
+        component_id, task_id = divmod(node, len(self._tasks))
+        return (self._components[component_id], self._tasks[task_id])
+
+    def _get_adjacency(self):
+        if self._adjacency is None:
+            node_count = len(self._components) * len(self._tasks)
+            self._adjacency = (
+                _build_adjacency(self._sources, self._targets, node_count),
+                _build_adjacency(self._targets, self._sources, node_count),
+            )
+        return self._adjacency
+
+    def _neighbors(self, component_task, implicit_offset, reverse):
+        node = self._find_node(component_task)
+        component_id, task_id = divmod(node, len(self._tasks))
+        neighbors = []
+        implicit_id = task_id + implicit_offset
+        if 0 <= implicit_id < self._task_counts[component_id]:
+            neighbors.append((component_task[0], self._tasks[implicit_id]))
+        offsets, adjacent = self._get_adjacency()[reverse]
+        for neighbor in adjacent[offsets[node] : offsets[node + 1]]:
+            neighbors.append(self._make_task(neighbor))
+        return neighbors
+
+    def get_tasks(self):
+        return [
+            (component, task)
+            for component, task_count in zip(self._components, self._task_counts)
+            for task in self._tasks[:task_count]
+        ]
+
+    def get_dependencies(self, component_task):
+        return self._neighbors(component_task, -1, 0)
+
+    def get_reverse_dependencies(self, component_task):
+        return self._neighbors(component_task, 1, 1)
+
+    def add_dependency(self, component_task, dependent_task):
+        node = self._add_node(component_task)
+        if dependent_task:
+            dependent_node = self._add_node(dependent_task)
+            same_component = component_task[0] == dependent_task[0]
+            if not same_component or dependent_node != node - 1:
+                # anything else is already an implicit dependency
+                self._sources.append(node)
+                self._targets.append(dependent_node)
+                self._adjacency = None
+
+    def get_critical_paths(self, weight_fn):
+        """
+        Calculate the weight of the heaviest path from each task to any task
+        nothing depends on, including the task itself.  Tasks that are part of
+        a dependency cycle aren't included.
+
+        Arguments:
+        weight_fn - a function that takes a (component, task) tuple and returns
+                    its weight (e.g., an expected duration)
+        """
+        return _critical_paths(
+            _CompactView(self.get_tasks, self.get_dependencies),
+            _CompactView(self.get_tasks, self.get_reverse_dependencies),
+            weight_fn,
+        )
+
+    def get_queue(self, priority_fn=None):
+        """
+        Create a queue to process tasks in dependency order.
+
+        Arguments:
+        priority_fn - an optional function that takes a (component, task) tuple
+                      and returns a number; when several tasks are ready, the
+                      tasks with the highest priority are provided first.
+        """
+        return _TaskQueue(
+            _CompactView(self.get_tasks, self.get_dependencies),
+            _CompactView(self.get_tasks, self.get_reverse_dependencies),
+            priority_fn,
+        )
@@ -0,0 +1,212 @@
+#!/usr/bin/python3
+
+"""
+Record a timeline of a run in Chrome's trace event format.  Traces can be
+opened with chrome://tracing or https://ui.perfetto.dev.
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+
+_CURRENT_TASK = contextvars.ContextVar("current_task", default=None)
+_TRACE = None
+
+
+def _task_name(component_task):
+    return "{} ({})".format(component_task[0], component_task[1])
+
+
+class Trace:
+    """
+    A thread-safe collection of trace events.  Events are timed relative to
+    when the trace was created.
+    """
+
+    def __init__(self):
+        self._events = []
+        self._threads = set()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._start = time.perf_counter()
+
+    def _timestamp(self, seconds):
+        return (seconds - self._start) * 1000000
+
+    def _add(self, event):
+        thread = threading.current_thread()
+        event["pid"] = self._pid
+        event["tid"] = thread.ident
+        with self._lock:
+            if thread.ident not in self._threads:
+                self._threads.add(thread.ident)
+                self._events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": self._pid,
+                        "tid": thread.ident,
+                        "args": {"name": thread.name},
+                    }
+                )
+            self._events.append(event)
+
+    def add_span(self, name, category, start, end, args):
+        """
+        Record something that took time.
+
+        Arguments:
+        name - the name to display
+        category - the kind of event (e.g., "task")
+        start - when the event started, from time.perf_counter
+        end - when the event finished, from time.perf_counter
+        args - a dictionary of extra information
+        """
+        # pylint: disable=too-many-arguments
+        self._add(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": self._timestamp(start),
+                "dur": (end - start) * 1000000,
+                "args": args,
+            }
+        )
+
+    def add_instant(self, name, category, args):
+        """
+        Record something that happened at a single point in time.
+
+        Arguments:
+        name - the name to display
+        category - the kind of event (e.g., "task")
+        args - a dictionary of extra information
+        """
+        self._add(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "i",
+                "s": "t",
+                "ts": self._timestamp(time.perf_counter()),
+                "args": args,
+            }
+        )
+
+    def write(self, path):
+        """Save the trace to a file."""
+        with self._lock:
+            events = list(self._events)
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+
+def start():
+    """Start recording events, returning the new Trace."""
+    global _TRACE  # pylint: disable=global-statement
+    _TRACE = Trace()
+    return _TRACE
+
+
+def stop():
+    """Stop recording events."""
+    global _TRACE  # pylint: disable=global-statement
+    _TRACE = None
+
+
+def current_task():
+    """Retrieve the (component, task) running in this context, if any."""
+    return _CURRENT_TASK.get()
+
+
+@contextlib.contextmanager
+def task(component_task):
+    """
+    Mark the enclosed code as running a task.  The task is recorded with a
+    status of "success" or "failure" depending on whether an exception is
+    raised.
+
+    Arguments:
+    component_task - the (component, task) being run
+    """
+    token = _CURRENT_TASK.set(component_task)
+    start_time = time.perf_counter()
+    status = "failure"
+    try:
+        yield
+        status = "success"
+    finally:
+        _CURRENT_TASK.reset(token)
+        trace = _TRACE
+        if trace is not None:
+            trace.add_span(
+                _task_name(component_task),
+                "task",
+                start_time,
+                time.perf_counter(),
+                {
+                    "component": component_task[0],
+                    "task": component_task[1],
+                    "status": status,
+                },
+            )
+
+
+def task_event(component_task, status):
+    """
+    Record a task that didn't run (e.g., because it was skipped).
+
+    Arguments:
+    component_task - the (component, task)
+    status - why the task didn't run
+    """
+    trace = _TRACE
+    if trace is not None:
+        trace.add_instant(
+            _task_name(component_task),
+            "task",
+            {
+                "component": component_task[0],
+                "task": component_task[1],
+                "status": status,
+            },
+        )
+
+
+@contextlib.contextmanager
+def command(args):
+    """
+    Mark the enclosed code as running a command.
+
+    Arguments:
+    args - the command's arguments
+    """
+    trace = _TRACE
+    if trace is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    status = "failure"
+    try:
+        yield
+        status = "success"
+    finally:
+        if isinstance(args, str):
+            args = [args]
+        args = [str(arg) for arg in args]
+        component_task = current_task()
+        trace.add_span(
+            " ".join(args),
+            "command",
+            start_time,
+            time.perf_counter(),
+            {
+                "args": args,
+                "status": status,
+                "task": _task_name(component_task) if component_task else None,
+            },
+        )
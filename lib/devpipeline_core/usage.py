@@ -0,0 +1,176 @@
+#!/usr/bin/python3
+
+"""Track the resources used by the commands each task runs."""
+
+import sys
+import threading
+
+import devpipeline_core.statefile
+import devpipeline_core.trace
+
+_USAGE_FILE = "task-usage.json"
+_TRACKER = None
+
+# ru_maxrss is in bytes on macOS and kilobytes everywhere else
+_MAXRSS_SCALE = 1024 if sys.platform == "darwin" else 1
+
+
+class ResourceUsage:
+    """
+    The combined resource usage of a group of commands.  Times are summed, as
+    are block operations; max_rss is the largest of any single command.
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        self.user_time = 0.0
+        self.system_time = 0.0
+        self.max_rss = 0
+        self.block_input = 0
+        self.block_output = 0
+        self.commands = 0
+
+    def add(self, user_time, system_time, max_rss, block_input, block_output):
+        """
+        Add the usage of a single command.
+
+        Arguments:
+        user_time - CPU seconds spent in user mode
+        system_time - CPU seconds spent in the kernel
+        max_rss - the largest resident set size, in kilobytes
+        block_input - the number of block input operations
+        block_output - the number of block output operations
+        """
+        # pylint: disable=too-many-arguments
+        self.user_time += user_time
+        self.system_time += system_time
+        self.max_rss = max(self.max_rss, max_rss)
+        self.block_input += block_input
+        self.block_output += block_output
+        self.commands += 1
+
+    def to_dict(self):
+        """Convert usage to a dictionary."""
+        return dict(vars(self))
+
+
+def rusage_values(rusage):
+    """
+    Extract the values ResourceUsage tracks from a resource.struct_rusage, in
+    the order ResourceUsage.add expects them.
+    """
+    return [
+        rusage.ru_utime,
+        rusage.ru_stime,
+        rusage.ru_maxrss // _MAXRSS_SCALE,
+        rusage.ru_inblock,
+        rusage.ru_oublock,
+    ]
+
+
+class UsageTracker:
+    """Resource usage for each (component, task), safe to update from threads."""
+
+    def __init__(self):
+        self._usage = {}
+        self._lock = threading.Lock()
+
+    def add(self, component_task, values):
+        """
+        Add the usage of a command run by a task.
+
+        Arguments:
+        component_task - the (component, task) that ran the command
+        values - usage values, as returned by rusage_values
+        """
+        with self._lock:
+            usage = self._usage.get(component_task)
+            if usage is None:
+                usage = ResourceUsage()
+                self._usage[component_task] = usage
+            usage.add(*values)
+
+    def get_usage(self):
+        """Retrieve a dictionary of (component, task) to ResourceUsage."""
+        with self._lock:
+            return dict(self._usage)
+
+
+def start():
+    """Start tracking resource usage, returning the new UsageTracker."""
+    global _TRACKER  # pylint: disable=global-statement
+    _TRACKER = UsageTracker()
+    return _TRACKER
+
+
+def stop():
+    """Stop tracking resource usage."""
+    global _TRACKER  # pylint: disable=global-statement
+    _TRACKER = None
+
+
+def record(values):
+    """
+    Record the usage of a command that just finished.  Usage is attributed to
+    the task running in the current context.
+
+    Arguments:
+    values - usage values, as returned by rusage_values
+    """
+    tracker = _TRACKER
+    component_task = devpipeline_core.trace.current_task()
+    if tracker is not None and component_task is not None:
+        tracker.add(component_task, values)
+
+
+def save(full_config, usage):
+    """
+    Save resource usage to each component's configuration directory, where
+    other tools can find it.
+
+    Arguments:
+    full_config - the full project configuration
+    usage - a dictionary of (component, task) to ResourceUsage
+    """
+    saved = devpipeline_core.statefile.ComponentState(full_config, _USAGE_FILE)
+    for (component, task), task_usage in usage.items():
+        saved.get(component)[task] = task_usage.to_dict()
+    saved.write()
+
+
+def format_summary(usage):
+    """
+    Create a table of resource usage, with the most CPU intensive tasks first.
+
+    Arguments:
+    usage - a dictionary of (component, task) to ResourceUsage
+    """
+    lines = [
+        "{:40} {:>9} {:>9} {:>10} {:>9} {:>9} {:>8}".format(
+            "Task",
+            "User(s)",
+            "Sys(s)",
+            "MaxRSS(MB)",
+            "BlocksIn",
+            "BlocksOut",
+            "Commands",
+        )
+    ]
+    for component_task, task_usage in sorted(
+        usage.items(),
+        key=lambda item: item[1].user_time + item[1].system_time,
+        reverse=True,
+    ):
+        lines.append(
+            "{:40} {:>9.2f} {:>9.2f} {:>10.1f} {:>9} {:>9} {:>8}".format(
+                "{} ({})".format(*component_task),
+                task_usage.user_time,
+                task_usage.system_time,
+                task_usage.max_rss / 1024,
+                task_usage.block_input,
+                task_usage.block_output,
+                task_usage.commands,
+            )
+        )
+    return "\n".join(lines)
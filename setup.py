@@ -12,12 +12,18 @@ setup(
     version=_VERSION,
     package_dir={"": "lib"},
     packages=find_packages("lib"),
+    python_requires=">=3.9",
     entry_points={
         "devpipeline.drivers": [
             "list-executors = devpipeline_core.cli_tools:_EXECUTORS_COMMAND",
+            "list-plugins = devpipeline_core.cli_tools:_PLUGINS_COMMAND",
             "list-resolvers = devpipeline_core.cli_tools:_RESOLVERS_COMMAND",
+            "task-history = devpipeline_core.cli_tools:_HISTORY_COMMAND",
         ],
         "devpipeline.executors": [
+            "async = devpipeline_core.executor:_ASYNC_EXECUTOR",
+            "capture = devpipeline_core.executor:_CAPTURE_EXECUTOR",
+            "capture-gzip = devpipeline_core.executor:_CAPTURE_GZIP_EXECUTOR",
             "dry-run = devpipeline_core.executor:_DRYRUN_EXECUTOR",
             "quiet = devpipeline_core.executor:_QUIET_EXECUTOR",
             "silent = devpipeline_core.executor:_SILENT_EXECUTOR",
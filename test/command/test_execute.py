@@ -0,0 +1,482 @@
+#!/usr/bin/python3
+
+import asyncio
+import gzip
+import io
+import json
+import os.path
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+
+import devpipeline_core.command
+import devpipeline_core.executor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))
+
+import mockargs
+import mockconfig
+import tempcache
+
+
+def setUpModule():
+    tempcache.start()
+
+
+def tearDownModule():
+    tempcache.stop()
+
+
+class _Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.order = []
+
+    def record(self, config_info, name):
+        with self._lock:
+            self.order.append("{}.{}".format(config_info.config.name, name))
+
+    def task(self, name):
+        return (name, lambda config_info: self.record(config_info, name))
+
+
+class TestExecuteTargets(unittest.TestCase):
+    def test_dependency_order(self):
+        configuration = mockconfig.WritableMockConfig(
+            {"a": {}, "b": {"depends.build": "a"}, "c": {"depends.build": "a, b"}}
+        )
+        recorder = _Recorder()
+        devpipeline_core.command.process_tasks(
+            mockargs.make_task_arguments(["c"], 4),
+            [recorder.task("checkout"), recorder.task("build")],
+            lambda: configuration,
+        )
+        order = recorder.order
+        self.assertEqual(6, len(order))
+        self.assertLess(order.index("a.build"), order.index("b.build"))
+        self.assertLess(order.index("b.build"), order.index("c.build"))
+        self.assertLess(order.index("c.checkout"), order.index("c.build"))
+
+    def test_concurrent_tasks(self):
+        configuration = mockconfig.WritableMockConfig({"a": {}, "b": {}})
+        barrier = threading.Barrier(2, timeout=5)
+
+        def _build(config_info):
+            del config_info
+            barrier.wait()
+
+        devpipeline_core.command.process_tasks(
+            mockargs.make_task_arguments(["a", "b"], 2),
+            [("build", _build)],
+            lambda: configuration,
+        )
+
+    def test_separate_config_info(self):
+        configuration = mockconfig.WritableMockConfig({"a": {}, "b": {}, "c": {}})
+        barrier = threading.Barrier(3, timeout=5)
+        seen = {}
+
+        def _build(config_info):
+            name = config_info.config.name
+            barrier.wait()
+            seen[name] = config_info.config.name
+
+        devpipeline_core.command.process_tasks(
+            mockargs.make_task_arguments(["a", "b", "c"], 3),
+            [("build", _build)],
+            lambda: configuration,
+        )
+        self.assertEqual({"a": "a", "b": "b", "c": "c"}, seen)
+
+    def test_keep_going(self):
+        configuration = mockconfig.WritableMockConfig(
+            {"a": {}, "b": {"depends.build": "a"}, "c": {}}
+        )
+        recorder = _Recorder()
+
+        def _build(config_info):
+            if config_info.config.name == "a":
+                raise Exception("failed")
+            recorder.record(config_info, "build")
+
+        def _run_fn():
+            devpipeline_core.command.process_tasks(
+                mockargs.make_task_arguments(["b", "c"], 2, keep_going=True),
+                [("build", _build)],
+                lambda: configuration,
+            )
+
+        self.assertRaises(devpipeline_core.command._PartialFailureException, _run_fn)
+        self.assertEqual(["c.build"], recorder.order)
+
+    def test_fail_immediately(self):
+        configuration = mockconfig.WritableMockConfig(
+            {"a": {}, "b": {"depends.build": "a"}}
+        )
+        recorder = _Recorder()
+
+        def _build(config_info):
+            if config_info.config.name == "a":
+                raise ValueError("failed")
+            recorder.record(config_info, "build")
+
+        def _run_fn():
+            devpipeline_core.command.process_tasks(
+                mockargs.make_task_arguments(["b"], 2),
+                [("build", _build)],
+                lambda: configuration,
+            )
+
+        self.assertRaises(ValueError, _run_fn)
+        self.assertEqual([], recorder.order)
+
+    def test_critical_path_schedule(self):
+        with tempfile.TemporaryDirectory() as config_dir:
+            durations = {"a": {"build": 1.0}, "b": {"build": 1.0}, "c": {"build": 60.0}}
+            with open(os.path.join(config_dir, "task-durations.json"), "w") as output:
+                json.dump(durations, output)
+            configuration = mockconfig.WritableMockConfig(
+                {name: {"dp.config_dir": config_dir} for name in ["a", "b", "c"]}
+            )
+            recorder = _Recorder()
+            arguments = mockargs.make_task_arguments(["a", "b", "c"], 1)
+            arguments.schedule = "critical-path"
+            devpipeline_core.command.process_tasks(
+                arguments, [recorder.task("build")], lambda: configuration
+            )
+            self.assertEqual("c.build", recorder.order[0])
+            with open(os.path.join(config_dir, "task-durations.json")) as saved:
+                durations = json.load(saved)
+            self.assertLess(durations["c"]["build"], 60.0)
+
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self):
+        self._config_dir = tempfile.TemporaryDirectory()
+        self._components = {
+            "a": {"dp.config_dir": self._config_dir.name},
+            "b": {"dp.config_dir": self._config_dir.name, "depends.build": "a"},
+            "c": {"dp.config_dir": self._config_dir.name},
+        }
+
+    def tearDown(self):
+        self._config_dir.cleanup()
+
+    def _run(self, executor="silent"):
+        configuration = mockconfig.WritableMockConfig(self._components)
+        recorder = _Recorder()
+        arguments = mockargs.make_task_arguments(["b", "c"], 1)
+        arguments.incremental = True
+        arguments.executor = executor
+        devpipeline_core.command.process_tasks(
+            arguments, [recorder.task("build")], lambda: configuration
+        )
+        return sorted(recorder.order)
+
+    def test_unchanged(self):
+        self.assertEqual(["a.build", "b.build", "c.build"], self._run())
+        self.assertEqual([], self._run())
+
+    def test_changed_dependency(self):
+        self._run()
+        self._components["a"]["build.option"] = "value"
+        self.assertEqual(["a.build", "b.build"], self._run())
+        self.assertEqual([], self._run())
+
+    def test_dry_run(self):
+        self._run("dry-run")
+        self.assertEqual(["a.build", "b.build", "c.build"], self._run())
+
+
+class TestTaskPools(unittest.TestCase):
+    def test_limits(self):
+        names = ["c{}".format(index) for index in range(6)]
+        configuration = mockconfig.WritableMockConfig({name: {} for name in names})
+        lock = threading.Lock()
+        running = {"checkout": 0, "build": 0}
+        seen = []
+
+        def _make_task(task):
+            def _task_fn(config_info):
+                del config_info
+                with lock:
+                    running[task] += 1
+                    seen.append(dict(running))
+                time.sleep(0.03)
+                with lock:
+                    running[task] -= 1
+
+            return (task, _task_fn)
+
+        arguments = mockargs.make_task_arguments(names, 1)
+        arguments.task_jobs = ["checkout=3", "build=1"]
+        devpipeline_core.command.process_tasks(
+            arguments,
+            [_make_task("checkout"), _make_task("build")],
+            lambda: configuration,
+        )
+        self.assertEqual(3, max(counts["checkout"] for counts in seen))
+        self.assertEqual(1, max(counts["build"] for counts in seen))
+        self.assertTrue(any(counts["checkout"] and counts["build"] for counts in seen))
+
+    def test_invalid_limit(self):
+        arguments = mockargs.make_task_arguments([], 1)
+        for task_jobs in [["build"], ["build=0"], ["=2"]]:
+            arguments.task_jobs = task_jobs
+            self.assertRaises(
+                Exception, devpipeline_core.command._get_task_pools, arguments, 1
+            )
+
+
+class TestAsyncExecutor(unittest.TestCase):
+    def _process(self, targets, jobs, tasks, configuration):
+        devpipeline_core.command.process_tasks(
+            mockargs.make_task_arguments(targets, jobs, executor="async"),
+            tasks,
+            lambda: configuration,
+        )
+
+    def test_concurrent_commands(self):
+        names = ["c{}".format(index) for index in range(20)]
+        configuration = mockconfig.WritableMockConfig({name: {} for name in names})
+        threads = set()
+
+        async def _build(config_info):
+            threads.add(threading.get_ident())
+            await config_info.executor.execute_async(
+                config_info.env,
+                {
+                    "args": [sys.executable, "-c", "import time; time.sleep(0.2)"],
+                    "stdout": asyncio.subprocess.DEVNULL,
+                },
+            )
+
+        self._process(names, len(names), [("build", _build)], configuration)
+        self.assertEqual(1, len(threads))
+
+    def test_dependency_order(self):
+        configuration = mockconfig.WritableMockConfig(
+            {"a": {}, "b": {"depends.build": "a"}}
+        )
+        recorder = _Recorder()
+
+        async def _build(config_info):
+            await asyncio.sleep(0)
+            recorder.record(config_info, "build")
+
+        self._process(["b"], 2, [("build", _build)], configuration)
+        self.assertEqual(["a.build", "b.build"], recorder.order)
+
+    def test_synchronous_task(self):
+        configuration = mockconfig.WritableMockConfig({"a": {}})
+        recorder = _Recorder()
+
+        def _build(config_info):
+            config_info.executor.execute(
+                config_info.env, {"args": [sys.executable, "-c", "pass"]}
+            )
+            recorder.record(config_info, "build")
+
+        self._process(["a"], 1, [("build", _build)], configuration)
+        self.assertEqual(["a.build"], recorder.order)
+
+    def test_synchronous_jobs(self):
+        names = ["c{}".format(index) for index in range(24)]
+        configuration = mockconfig.WritableMockConfig({name: {} for name in names})
+
+        def _build(config_info):
+            del config_info
+            time.sleep(0.2)
+
+        start = time.monotonic()
+        self._process(names, len(names), [("build", _build)], configuration)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_synchronous_execute(self):
+        configuration = mockconfig.WritableMockConfig({"a": {}, "b": {}})
+        command = {"args": [sys.executable, "-c", "pass"]}
+
+        async def _coroutine(config_info):
+            config_info.executor.execute(config_info.env, command)
+
+        def _function(config_info):
+            config_info.executor.execute(config_info.env, command)
+
+        # both run their commands without starting another event loop
+        with unittest.mock.patch("asyncio.run") as run:
+            self._process(["a"], 2, [("build", _coroutine)], configuration)
+            self._process(["b"], 2, [("build", _function)], configuration)
+        run.assert_not_called()
+
+    def test_command_failure(self):
+        executor = devpipeline_core.executor.AsyncExecutor()
+        self.assertRaises(
+            subprocess.CalledProcessError,
+            executor.execute,
+            {},
+            {"args": [sys.executable, "-c", "raise SystemExit(3)"]},
+        )
+
+    def test_long_line(self):
+        executor = devpipeline_core.executor.AsyncExecutor()
+        output = io.StringIO()
+        with unittest.mock.patch("sys.stdout", output):
+            executor.execute(
+                {}, {"args": [sys.executable, "-c", "print('x' * 200000)"]}
+            )
+        self.assertEqual("x" * 200000 + "\n", output.getvalue())
+
+
+def _print_lines(count):
+    return {
+        "args": [
+            sys.executable,
+            "-c",
+            "for i in range({}): print('line', i)".format(count),
+        ]
+    }
+
+
+class TestCaptureExecutor(unittest.TestCase):
+    def setUp(self):
+        self._config_dir = tempfile.TemporaryDirectory()
+        self._stdout = io.TextIOWrapper(io.BytesIO())
+        self._patch = unittest.mock.patch.object(sys, "stdout", self._stdout)
+        self._patch.start()
+
+    def tearDown(self):
+        self._patch.stop()
+        self._config_dir.cleanup()
+
+    def _process(self, executor, build_fn):
+        configuration = mockconfig.WritableMockConfig(
+            {"a": {"dp.config_dir": self._config_dir.name}}
+        )
+        devpipeline_core.command.process_tasks(
+            mockargs.make_task_arguments(["a"], 1, executor=executor),
+            [("build", build_fn)],
+            lambda: configuration,
+        )
+
+    def _output(self):
+        self._stdout.flush()
+        return self._stdout.buffer.getvalue().decode()
+
+    def test_success(self):
+        def _build(config_info):
+            config_info.executor.execute(config_info.env, _print_lines(20000))
+
+        self._process("capture", _build)
+        self.assertNotIn("line", self._output())
+        with open(os.path.join(self._config_dir.name, "logs", "a.build.log")) as log:
+            lines = log.read().splitlines()
+        self.assertEqual(20000, len(lines))
+        self.assertEqual("line 19999", lines[-1])
+
+    def test_failure(self):
+        def _build(config_info):
+            config_info.executor.execute(config_info.env, _print_lines(3))
+            raise Exception("failed")
+
+        self.assertRaises(Exception, self._process, "capture-gzip", _build)
+        self.assertIn("line 2", self._output())
+        path = os.path.join(self._config_dir.name, "logs", "a.build.log.gz")
+        with gzip.open(path, "rt") as log:
+            self.assertEqual(3, len(log.read().splitlines()))
+
+    def test_bounded_buffer(self):
+        path = os.path.join(self._config_dir.name, "task.log")
+        task_log = devpipeline_core.executor._TaskLog(path, 16, False)
+        task_log.write(b"x" * 10)
+        self.assertEqual(0, os.path.getsize(path))
+        task_log.write(b"x" * 10)
+        task_log._log_file.flush()
+        self.assertEqual(20, os.path.getsize(path))
+        task_log.close()
+
+
+class TestTrace(unittest.TestCase):
+    def test_trace(self):
+        configuration = mockconfig.WritableMockConfig(
+            {"a": {}, "b": {"depends.build": "a"}, "c": {}}
+        )
+
+        def _build(config_info):
+            if config_info.config.name == "a":
+                raise Exception("failed")
+            config_info.executor.execute(
+                config_info.env, {"args": [sys.executable, "-c", "pass"]}
+            )
+
+        with tempfile.TemporaryDirectory() as trace_dir:
+            arguments = mockargs.make_task_arguments(["b", "c"], 2, keep_going=True)
+            arguments.trace = os.path.join(trace_dir, "trace.json")
+            self.assertRaises(
+                devpipeline_core.command._PartialFailureException,
+                devpipeline_core.command.process_tasks,
+                arguments,
+                [("build", _build)],
+                lambda: configuration,
+            )
+            with open(arguments.trace) as trace_file:
+                events = json.load(trace_file)["traceEvents"]
+
+        statuses = {
+            event["args"]["component"]: event["args"]["status"]
+            for event in events
+            if event.get("cat") == "task"
+        }
+        self.assertEqual({"a": "failure", "b": "skipped", "c": "success"}, statuses)
+        commands = [event for event in events if event.get("cat") == "command"]
+        self.assertEqual(1, len(commands))
+        self.assertEqual("c (build)", commands[0]["args"]["task"])
+        self.assertEqual("X", commands[0]["ph"])
+        self.assertTrue(any(event["ph"] == "M" for event in events))
+
+    def test_invalid_path(self):
+        recorder = _Recorder()
+        arguments = mockargs.make_task_arguments(["a"], 1)
+        arguments.trace = os.path.join(tempfile.gettempdir(), "no-such-dir", "trace")
+        self.assertRaises(
+            Exception,
+            devpipeline_core.command.process_tasks,
+            arguments,
+            [recorder.task("build")],
+            lambda: mockconfig.WritableMockConfig({"a": {}}),
+        )
+        self.assertEqual([], recorder.order)
+
+    def test_unwritable_trace(self):
+        written = []
+
+        class _Config(mockconfig.WritableMockConfig):
+            def write(self):
+                written.append(True)
+
+        trace_dir = tempfile.mkdtemp()
+        arguments = mockargs.make_task_arguments(["a"], 1)
+        arguments.trace = os.path.join(trace_dir, "trace.json")
+
+        def _build(config_info):
+            del config_info
+            # the trace can't be written once its directory is gone
+            os.rmdir(trace_dir)
+            raise ValueError("failed")
+
+        # the task's failure is reported, and state is still saved
+        self.assertRaises(
+            ValueError,
+            devpipeline_core.command.process_tasks,
+            arguments,
+            [("build", _build)],
+            lambda: _Config({"a": {}}),
+        )
+        self.assertEqual([True], written)
+
+
+if __name__ == "__main__":
+    unittest.main()
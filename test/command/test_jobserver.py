@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+
+import os
+import os.path
+import sys
+import threading
+import time
+import unittest
+import unittest.mock
+
+import devpipeline_core.command
+import devpipeline_core.jobserver
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))
+
+import mockargs
+import mockconfig
+import tempcache
+
+
+def setUpModule():
+    tempcache.start()
+
+
+def tearDownModule():
+    tempcache.stop()
+
+
+class TestJobServer(unittest.TestCase):
+    def test_tokens(self):
+        job_server = devpipeline_core.jobserver.JobServer.create(2)
+        try:
+            self.assertTrue(job_server.acquire(("a", "build")))
+            self.assertTrue(job_server.acquire(("b", "build")))
+            self.assertFalse(job_server.acquire(("c", "build")))
+            job_server.release(("b", "build"))
+            self.assertTrue(job_server.acquire(("c", "build")))
+        finally:
+            job_server.close()
+
+    def test_inherit(self):
+        outer = devpipeline_core.jobserver.JobServer.create(3)
+        environment = {"MAKEFLAGS": outer.makeflags}
+        try:
+            self.assertTrue(outer.acquire(("outer", "build")))
+            inner = devpipeline_core.jobserver.JobServer.inherit(environment)
+            try:
+                # one implicit token plus the two left in the shared pipe
+                for name in ["a", "b", "c"]:
+                    self.assertTrue(inner.acquire((name, "build")))
+                self.assertFalse(outer.acquire(("other", "build")))
+                inner.release(("c", "build"))
+                self.assertTrue(outer.acquire(("other", "build")))
+            finally:
+                inner.close()
+        finally:
+            outer.close()
+        self.assertIsNone(devpipeline_core.jobserver.JobServer.inherit({}))
+
+    def test_inherit_descriptors(self):
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, b"+")
+        makeflags = "k -j2 --jobserver-auth={},{}".format(read_fd, write_fd)
+        try:
+            inner = devpipeline_core.jobserver.JobServer.inherit(
+                {"MAKEFLAGS": makeflags}
+            )
+            try:
+                self.assertTrue(inner.acquire(("a", "build")))
+                self.assertTrue(inner.acquire(("b", "build")))
+                self.assertFalse(inner.acquire(("c", "build")))
+                # the descriptors won't reach commands, so don't advertise them
+                self.assertEqual("k", inner.makeflags)
+            finally:
+                inner.close()
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+
+def _read_tokens(makeflags):
+    path = devpipeline_core.jobserver.find_jobserver({"MAKEFLAGS": makeflags})[5:]
+    read_fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    write_fd = os.open(path, os.O_WRONLY)
+    try:
+        tokens = b""
+        try:
+            while True:
+                token = os.read(read_fd, 1)
+                if not token:
+                    break
+                tokens += token
+        except BlockingIOError:
+            pass
+        os.write(write_fd, tokens)
+        return len(tokens)
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+class TestJobServerTasks(unittest.TestCase):
+    def _run(self, names, jobs, environment, build):
+        configuration = mockconfig.WritableMockConfig({name: {} for name in names})
+        arguments = mockargs.make_task_arguments(
+            configuration.keys(), jobs, jobserver=True
+        )
+        with unittest.mock.patch.dict(os.environ, environment):
+            devpipeline_core.command.process_tasks(
+                arguments, [("build", build)], lambda: configuration
+            )
+
+    def _process(self, jobs, environment):
+        lock = threading.Lock()
+        state = {"running": 0, "most": 0, "makeflags": set()}
+
+        def _build(config_info):
+            with lock:
+                state["running"] += 1
+                state["most"] = max(state["most"], state["running"])
+                state["makeflags"].add(config_info.env.get("MAKEFLAGS"))
+            time.sleep(0.05)
+            with lock:
+                state["running"] -= 1
+
+        self._run([str(index) for index in range(6)], jobs, environment, _build)
+        return state
+
+    def test_server(self):
+        state = self._process(3, {})
+        self.assertEqual(3, state["most"])
+        self.assertEqual(1, len(state["makeflags"]))
+        self.assertIn("--jobserver-auth=fifo:", state["makeflags"].pop())
+
+    def test_client(self):
+        outer = devpipeline_core.jobserver.JobServer.create(2)
+        try:
+            state = self._process(6, {"MAKEFLAGS": outer.makeflags})
+        finally:
+            outer.close()
+        self.assertEqual(2, state["most"])
+        self.assertEqual({outer.makeflags}, state["makeflags"])
+
+    def test_nested_tokens(self):
+        # a nested build gets every token that isn't used by a running task
+        for jobs in [2, 4]:
+            tokens = []
+
+            def _build(config_info):
+                tokens.append(_read_tokens(config_info.env["MAKEFLAGS"]))
+
+            self._run(["a"], jobs, {}, _build)
+            self.assertEqual([jobs - 1], tokens)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+
+import os.path
+import sys
+import threading
+import time
+import unittest
+
+import devpipeline_core.command
+import devpipeline_core.resources
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))
+
+import mockargs
+import mockconfig
+import tempcache
+
+
+def setUpModule():
+    tempcache.start()
+
+
+def tearDownModule():
+    tempcache.stop()
+
+
+class TestResourceGate(unittest.TestCase):
+    def test_parse_size(self):
+        parse_size = devpipeline_core.resources.parse_size
+        self.assertEqual(512, parse_size("512"))
+        self.assertEqual(1.5 * 2 ** 30, parse_size("1.5G"))
+        self.assertEqual(16 * 2 ** 20, parse_size("16MiB"))
+        self.assertRaises(Exception, parse_size, "lots")
+
+    def test_budget(self):
+        configuration = mockconfig.MockConfig(
+            {
+                "heavy": {"resources.build.memory": "12G"},
+                "heavier": {"resources.build.memory": "8G"},
+                "wide": {"resources.build.cpu": "3"},
+                "light": {},
+            }
+        )
+        gate = devpipeline_core.resources.ResourceGate(
+            configuration, {"cpu": 4.0, "memory": 16.0 * 2 ** 30}
+        )
+        self.assertTrue(gate.acquire(("heavy", "build")))
+        self.assertFalse(gate.acquire(("heavier", "build")))
+        self.assertTrue(gate.acquire(("wide", "build")))
+        self.assertFalse(gate.acquire(("light", "build")))
+        gate.release(("wide", "build"))
+        self.assertTrue(gate.acquire(("light", "build")))
+        gate.release(("heavy", "build"))
+        self.assertTrue(gate.acquire(("heavier", "build")))
+
+    def test_oversized(self):
+        configuration = mockconfig.MockConfig({"huge": {"resources.build.cpu": "64"}})
+        gate = devpipeline_core.resources.ResourceGate(
+            configuration, {"cpu": 4.0, "memory": 1.0}
+        )
+        self.assertTrue(gate.acquire(("huge", "build")))
+        self.assertFalse(gate.acquire(("other", "build")))
+        gate.release(("huge", "build"))
+        self.assertTrue(gate.acquire(("other", "build")))
+
+
+class TestResourceScheduling(unittest.TestCase):
+    def test_heavy_tasks_apart(self):
+        components = {"heavy{}".format(index): {} for index in range(3)}
+        for component in components.values():
+            component["resources.build.memory"] = "10G"
+        components.update({"light{}".format(index): {} for index in range(4)})
+        configuration = mockconfig.WritableMockConfig(components)
+        lock = threading.Lock()
+        running = set()
+        together = []
+
+        def _build(config_info):
+            name = config_info.config.name
+            with lock:
+                running.add(name)
+                together.append(set(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(name)
+
+        arguments = mockargs.make_task_arguments(
+            components, 8, cpu_budget=4.0, memory_budget="16G"
+        )
+        devpipeline_core.command.process_tasks(
+            arguments, [("build", _build)], lambda: configuration
+        )
+        for names in together:
+            self.assertLessEqual(len(names), 4)
+            self.assertLessEqual(
+                len([name for name in names if name.startswith("heavy")]), 1
+            )
+        self.assertTrue(any(len(names) > 1 for names in together))
+
+    def test_budget_without_jobs(self):
+        components = {
+            "c{}".format(index): {"resources.build.cpu": "0.5"} for index in range(8)
+        }
+        configuration = mockconfig.WritableMockConfig(components)
+        barrier = threading.Barrier(4, timeout=5)
+        lock = threading.Lock()
+        state = {"running": 0, "most": 0}
+
+        def _build(config_info):
+            del config_info
+            with lock:
+                state["running"] += 1
+                state["most"] = max(state["most"], state["running"])
+            # only the budget lets four of these run together
+            barrier.wait()
+            with lock:
+                state["running"] -= 1
+
+        arguments = mockargs.make_task_arguments(components, cpu_budget=2.0)
+        devpipeline_core.command.process_tasks(
+            arguments, [("build", _build)], lambda: configuration
+        )
+        self.assertEqual(4, state["most"])
+
+
+if __name__ == "__main__":
+    unittest.main()
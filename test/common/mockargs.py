@@ -0,0 +1,16 @@
+#!/usr/bin/python3
+
+import argparse
+
+
+def make_task_arguments(
+    targets, jobs=None, keep_going=False, executor="silent", **kwargs
+):
+    return argparse.Namespace(
+        targets=list(targets),
+        dependencies="deep",
+        executor=executor,
+        keep_going=keep_going,
+        jobs=jobs,
+        **kwargs
+    )
@@ -39,8 +39,7 @@ class MockConfig:
         return self._config.keys()
 
     def items(self):
-        # return _CachedComponentIterator(self._config.sections(), self)
-        pass
+        return [(name, self.get(name)) for name in self._config]
 
     def get(self, component):
         """Get a specific component to operate on"""
@@ -54,3 +53,8 @@ class MockConfig:
 
     def __contains__(self, item):
         return item in self._config
+
+
+class WritableMockConfig(MockConfig):
+    def write(self):
+        pass
@@ -0,0 +1,22 @@
+#!/usr/bin/python3
+
+import os
+import tempfile
+import unittest.mock
+
+_ACTIVE = []
+
+
+def start():
+    """Point the user's cache directory (e.g., the plugin index) somewhere temporary."""
+    cache_dir = tempfile.TemporaryDirectory()
+    patch = unittest.mock.patch.dict(os.environ, {"XDG_CACHE_HOME": cache_dir.name})
+    patch.start()
+    _ACTIVE.append((cache_dir, patch))
+
+
+def stop():
+    """Restore the cache directory replaced by the last call to start."""
+    cache_dir, patch = _ACTIVE.pop()
+    patch.stop()
+    cache_dir.cleanup()
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+
+import os
+import os.path
+import sys
+import unittest
+
+import devpipeline_core.env
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))
+
+import mockconfig
+
+_BASE = {"PATH": "/usr/bin", "HOME": "/home/user", "EDITOR": "vi"}
+
+
+def _make_component(config):
+    return mockconfig.MockComponent("foo", config)
+
+
+class TestCreateEnvironment(unittest.TestCase):
+    def test_unchanged(self):
+        env = devpipeline_core.env.create_environment(_make_component({}), _BASE)
+        self.assertEqual(_BASE, env)
+
+    def test_prepend_append(self):
+        component = _make_component(
+            {
+                "dp.env_list": "path",
+                "env.path.prepend": "/opt/bin",
+                "env.path.append": "/usr/local/bin",
+            }
+        )
+        env = devpipeline_core.env.create_environment(component, _BASE)
+        expected = os.pathsep.join(["/opt/bin", "/usr/bin", "/usr/local/bin"])
+        self.assertEqual(expected, env["PATH"])
+
+    def test_override(self):
+        component = _make_component(
+            {"dp.env_list": "home, dp_test", "env.home": "/tmp", "env.dp_test": "1"}
+        )
+        env = devpipeline_core.env.create_environment(component, _BASE)
+        # overrides only apply to variables that aren't already set
+        self.assertEqual("/home/user", env["HOME"])
+        self.assertEqual("1", env["DP_TEST"])
+        self.assertEqual(dict(_BASE, DP_TEST="1"), env.materialize())
+
+    def test_copy_on_write(self):
+        component = _make_component({"dp.env_list": "dp_test", "env.dp_test": "1"})
+        env = devpipeline_core.env.create_environment(component, _BASE)
+        copied = env.copy()
+        copied["EDITOR"] = "emacs"
+        del copied["PATH"]
+        del copied["DP_TEST"]
+        self.assertEqual("vi", env["EDITOR"])
+        self.assertEqual("/usr/bin", env["PATH"])
+        self.assertEqual("1", env["DP_TEST"])
+        self.assertEqual({"HOME": "/home/user", "EDITOR": "emacs"}, copied)
+        self.assertEqual("vi", _BASE["EDITOR"])
+
+
+class TestEnvironmentCache(unittest.TestCase):
+    def test_independent(self):
+        cache = devpipeline_core.env.EnvironmentCache()
+        component = _make_component({"dp.env_list": "dp_test", "env.dp_test": "1"})
+        first = cache.get(component)
+        first["DP_TEST"] = "2"
+        second = cache.get(component)
+        self.assertEqual("1", second["DP_TEST"])
+        self.assertEqual(dict(os.environ, DP_TEST="1"), second.materialize())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+
+import os.path
+import subprocess
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+import devpipeline_core.executor
+import devpipeline_core.trace
+import devpipeline_core.usage
+
+
+class TestSpawn(unittest.TestCase):
+    def test_can_spawn(self):
+        can_spawn = devpipeline_core.executor._can_spawn
+        self.assertTrue(can_spawn({"args": ["true"]}))
+        self.assertTrue(can_spawn({"args": ["true"], "stdout": None}))
+        self.assertFalse(can_spawn({"args": ["true"], "cwd": "/"}))
+        self.assertFalse(can_spawn({"args": "true", "shell": True}))
+        self.assertFalse(can_spawn({"args": ["true"], "stdout": subprocess.PIPE}))
+
+    def test_output(self):
+        executor = devpipeline_core.executor.QuietExecutor()
+        with tempfile.TemporaryFile() as output:
+            with unittest.mock.patch.object(
+                devpipeline_core.executor.subprocess, "Popen"
+            ) as popen:
+                executor.execute(
+                    {"VALUE": "spawned"},
+                    {
+                        "args": [
+                            sys.executable,
+                            "-c",
+                            "import os; print(os.environ['VALUE'])",
+                        ],
+                        "stdout": output,
+                    },
+                )
+            popen.assert_not_called()
+            output.seek(0)
+            self.assertEqual(b"spawned\n", output.read())
+
+    def test_failure(self):
+        executor = devpipeline_core.executor.QuietExecutor()
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            executor.execute(
+                None, {"args": [sys.executable, "-c", "raise SystemExit(3)"]}
+            )
+        self.assertEqual(3, context.exception.returncode)
+
+    def test_default_signals(self):
+        executor = devpipeline_core.executor.QuietExecutor()
+        with tempfile.TemporaryFile() as output:
+            executor.execute(
+                None, {"args": ["sh", "-c", "yes | head -1"], "stderr": output}
+            )
+            output.seek(0)
+            self.assertEqual(b"", output.read())
+
+    def test_missing_program(self):
+        executor = devpipeline_core.executor.QuietExecutor()
+        self.assertRaises(
+            OSError,
+            executor.execute,
+            None,
+            {"args": [os.path.join(tempfile.gettempdir(), "no-such-program")]},
+        )
+
+
+_BUSY_COMMAND = {
+    "args": [sys.executable, "-c", "sum(range(2000000)); bytearray(32 * 2 ** 20)"]
+}
+
+
+class TestUsage(unittest.TestCase):
+    def setUp(self):
+        self._tracker = devpipeline_core.usage.start()
+
+    def tearDown(self):
+        devpipeline_core.usage.stop()
+
+    def _execute(self, executor, *commands):
+        with devpipeline_core.trace.task(("a", "build")):
+            executor.execute(None, *commands)
+        return self._tracker.get_usage()[("a", "build")]
+
+    def _check_usage(self, usage, commands):
+        self.assertEqual(commands, usage.commands)
+        self.assertGreater(usage.user_time + usage.system_time, 0)
+        self.assertGreater(usage.max_rss, 32 * 1024)
+
+    def test_spawn(self):
+        executor = devpipeline_core.executor.QuietExecutor()
+        self._check_usage(self._execute(executor, _BUSY_COMMAND, _BUSY_COMMAND), 2)
+
+    def test_subprocess(self):
+        executor = devpipeline_core.executor.QuietExecutor()
+        command = dict(_BUSY_COMMAND, cwd=tempfile.gettempdir())
+        self._check_usage(self._execute(executor, command), 1)
+
+    def test_summary(self):
+        usage = devpipeline_core.usage.ResourceUsage()
+        usage.add(1.5, 0.5, 2048, 10, 20)
+        summary = devpipeline_core.usage.format_summary({("a", "build"): usage})
+        self.assertIn("a (build)", summary.splitlines()[1])
+        self.assertIn("1.50", summary)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+
+import os.path
+import sys
+import tempfile
+import unittest
+
+import devpipeline_core.command
+import devpipeline_core.history
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))
+
+import mockargs
+import mockconfig
+import tempcache
+
+
+def setUpModule():
+    tempcache.start()
+
+
+def tearDownModule():
+    tempcache.stop()
+
+
+class TestBuildHistory(unittest.TestCase):
+    def setUp(self):
+        self._history_dir = tempfile.TemporaryDirectory()
+        self._history = devpipeline_core.history.BuildHistory(
+            os.path.join(self._history_dir.name, "history.sqlite")
+        )
+        runs = [(1, 1.0, 5.0), (2, 1.0, 5.0), (3, 3.0, 5.0)]
+        for started, a_duration, b_duration in runs:
+            self._history.add_run(
+                started,
+                "quiet",
+                "deep",
+                [
+                    ("a", "build", a_duration, "success", None),
+                    ("b", "build", b_duration, "success", None),
+                    ("c", "build", None, "skipped", None),
+                ],
+            )
+
+    def tearDown(self):
+        self._history.close()
+        self._history_dir.cleanup()
+
+    def test_slowest(self):
+        self.assertEqual(
+            [(("b", "build"), 5.0), (("a", "build"), 5.0 / 3)],
+            self._history.get_slowest(10, 10),
+        )
+        self.assertEqual([(("a", "build"), 3.0)], self._history.get_slowest(1, 10)[1:])
+
+    def test_trend(self):
+        self.assertEqual(
+            [(2, 1.0, "success"), (3, 3.0, "success")],
+            self._history.get_trend("a", "build", 2),
+        )
+
+    def test_slower(self):
+        self.assertEqual([(("a", "build"), 3.0, 1.0)], self._history.get_slower(3, 1.2))
+        self.assertEqual([], self._history.get_slower(3, 4.0))
+
+
+class TestRecordRun(unittest.TestCase):
+    def test_process_tasks(self):
+        with tempfile.TemporaryDirectory() as config_dir:
+            configuration = mockconfig.WritableMockConfig(
+                {
+                    "a": {"dp.config_dir": config_dir},
+                    "b": {"dp.config_dir": config_dir, "depends.build": "a"},
+                }
+            )
+
+            def _build(config_info):
+                if config_info.config.name == "a":
+                    raise Exception("failed")
+
+            arguments = mockargs.make_task_arguments(["b"], 1, keep_going=True)
+            self.assertRaises(
+                devpipeline_core.command._PartialFailureException,
+                devpipeline_core.command.process_tasks,
+                arguments,
+                [("build", _build)],
+                lambda: configuration,
+            )
+            history = devpipeline_core.history.BuildHistory(
+                os.path.join(config_dir, "build-history.sqlite")
+            )
+            try:
+                outcomes = {
+                    component: history.get_trend(component, "build", 1)[0][2]
+                    for component in ["a", "b"]
+                }
+            finally:
+                history.close()
+        self.assertEqual({"a": "failure", "b": "skipped"}, outcomes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+
+import os
+import os.path
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+import devpipeline_core.plugin
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))
+
+import tempcache
+
+
+def setUpModule():
+    tempcache.start()
+
+
+def tearDownModule():
+    tempcache.stop()
+
+
+class TestQueryPlugins(unittest.TestCase):
+    def test_lazy_discovery(self):
+        with unittest.mock.patch.object(
+            devpipeline_core.plugin, "_find_entry_points"
+        ) as find_fn:
+            plugins = devpipeline_core.plugin.query_plugins("test")
+            find_fn.assert_not_called()
+            find_fn.return_value = {}
+            self.assertEqual([], list(plugins))
+            self.assertEqual([], list(plugins))
+            find_fn.assert_called_once_with("test")
+
+    def test_lazy_load(self):
+        entry_points = {
+            "good": "posixpath:join",
+            "bad": "devpipeline_core.missing:plugin",
+        }
+        with unittest.mock.patch.object(
+            devpipeline_core.plugin, "_find_entry_points", return_value=entry_points
+        ):
+            plugins = devpipeline_core.plugin.query_plugins("test")
+            self.assertEqual(["bad", "good"], sorted(plugins))
+            self.assertTrue("bad" in plugins)
+            self.assertFalse("other" in plugins)
+            self.assertEqual(None, plugins.get("other"))
+            self.assertEqual("posixpath:join", plugins.get_target("good"))
+            self.assertEqual("a/b", plugins["good"]("a", "b"))
+            self.assertRaises(ImportError, plugins.get, "bad")
+
+    def test_installed_plugins(self):
+        executors = devpipeline_core.plugin.query_plugins("devpipeline.executors")
+        if "quiet" not in executors:
+            self.skipTest("dev-pipeline-core isn't installed")
+        self.assertEqual("QuietExecutor", executors["quiet"][0].__name__)
+
+    def test_load_targets(self):
+        load_fn = devpipeline_core.plugin._load_entry_point
+        self.assertEqual(os.path, load_fn("os:path"))
+        self.assertEqual(os.path.join, load_fn("os:path.join [extra]"))
+        self.assertEqual(os.path, load_fn("os.path"))
+
+
+class TestEntryPointIndex(unittest.TestCase):
+    def setUp(self):
+        self._cache_dir = tempfile.TemporaryDirectory()
+        self._patches = [
+            unittest.mock.patch.object(
+                devpipeline_core.plugin,
+                "_get_index_path",
+                return_value=os.path.join(self._cache_dir.name, "index.json"),
+            ),
+            unittest.mock.patch.object(
+                devpipeline_core.plugin,
+                "_discover_entry_points",
+                return_value={"test": {"plugin": "os:path"}},
+            ),
+        ]
+        for patch in self._patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self._patches:
+            patch.stop()
+        self._cache_dir.cleanup()
+
+    def test_cached(self):
+        index = devpipeline_core.plugin._EntryPointIndex()
+        self.assertEqual({"test": {"plugin": "os:path"}}, index.get_groups())
+        self.assertFalse(index.from_cache)
+
+        index = devpipeline_core.plugin._EntryPointIndex()
+        self.assertEqual({"test": {"plugin": "os:path"}}, index.get_groups())
+        self.assertTrue(index.from_cache)
+        devpipeline_core.plugin._discover_entry_points.assert_called_once_with()
+
+    def test_metadata_changed(self):
+        devpipeline_core.plugin._EntryPointIndex().get_groups()
+        with unittest.mock.patch.object(
+            devpipeline_core.plugin, "_metadata_stamp", return_value=["changed"]
+        ):
+            index = devpipeline_core.plugin._EntryPointIndex()
+            index.get_groups()
+        self.assertFalse(index.from_cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+
+import json
+import os.path
+import sys
+import tempfile
+import unittest
+
+import devpipeline_core.graphcache
+import devpipeline_core.resolve
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))
+
+import mockconfig
+
+
+def _make_config(config_dir, components):
+    for component in components.values():
+        component["dp.config_dir"] = config_dir
+    return mockconfig.MockConfig(components)
+
+
+def _resolve(configuration, resolver, resolver_name="deep"):
+    return devpipeline_core.graphcache.resolve(
+        resolver_name, resolver, ["c"], configuration, ["checkout", "build"]
+    )
+
+
+class TestGraphCache(unittest.TestCase):
+    def setUp(self):
+        self._config_dir = tempfile.TemporaryDirectory()
+        self._cache_path = os.path.join(self._config_dir.name, "resolved-graph.json")
+
+    def tearDown(self):
+        self._config_dir.cleanup()
+
+    def _make_config(self, components):
+        return _make_config(self._config_dir.name, components)
+
+    def _tamper(self):
+        # drop every explicit dependency so a cached graph is recognizable
+        with open(self._cache_path) as cache_file:
+            cached = json.load(cache_file)
+        graph = cached["graph"]
+        graph["dependencies"] = [
+            [dependency for dependency in dependencies if dependency == index - 1]
+            for index, dependencies in enumerate(graph["dependencies"])
+        ]
+        with open(self._cache_path, "w") as cache_file:
+            json.dump(cached, cache_file)
+
+    def test_cache_reused(self):
+        components = {"a": {}, "b": {"depends.build": "a"}, "c": {"depends.build": "b"}}
+        resolver = devpipeline_core.resolve.calculate_dependencies
+        dm = _resolve(self._make_config(components), resolver)
+        reverse_dependencies = list(dm.get_reverse_dependencies(("a", "build")))
+        self.assertEqual([("b", "build")], reverse_dependencies)
+        self._tamper()
+
+        # a component outside the graph doesn't invalidate the cache
+        components["d"] = {"depends.build": "c"}
+        dm = _resolve(self._make_config(components), resolver)
+        self.assertEqual([], list(dm.get_reverse_dependencies(("a", "build"))))
+
+    def test_cache_invalidated(self):
+        components = {"a": {}, "b": {"depends.build": "a"}, "c": {"depends.build": "b"}}
+        resolver = devpipeline_core.resolve.calculate_dependencies
+        _resolve(self._make_config(components), resolver)
+        self._tamper()
+
+        components["b"] = {}
+        dm = _resolve(self._make_config(components), resolver)
+        self.assertFalse(("a", "build") in dm.get_tasks())
+        self.assertEqual(
+            [("c", "build")], list(dm.get_reverse_dependencies(("b", "build")))
+        )
+
+    def test_reverse_invalidated(self):
+        components = {"a": {}, "b": {}, "c": {}}
+        resolver = devpipeline_core.resolve._process_reverse
+        _resolve(self._make_config(components), resolver, "reverse")
+
+        components["d"] = {"depends.build": "c"}
+        dm = _resolve(self._make_config(components), resolver, "reverse")
+        self.assertEqual(
+            [("d", "build")], list(dm.get_reverse_dependencies(("c", "build")))
+        )
+
+    def test_uncached_resolver(self):
+        components = {"c": {}}
+        resolver = devpipeline_core.resolve._process_none
+        _resolve(self._make_config(components), resolver, "none")
+        self.assertFalse(os.path.exists(self._cache_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -49,6 +49,62 @@ class TestReverseResolver(unittest.TestCase):
         self.assertEqual(1, len(order))
         self.assertEqual(order[0], "c.build")
 
+    def test_diamond_deps(self):
+        configuration = mockconfig.MockConfig(
+            {
+                "a": {},
+                "b": {"depends.build": "a"},
+                "c": {"depends.checkout": "a"},
+                "d": {"depends.build": "b, c"},
+                "e": {},
+            }
+        )
+        order = _order_resolve(
+            devpipeline_core.resolve._process_reverse(
+                ["a"], configuration, ["checkout", "build"]
+            )
+        )
+        self.assertEqual(8, len(order))
+        self.assertFalse("e.build" in order)
+        _test_order(self, ["a.checkout", "c.checkout", "c.build", "d.build"], order)
+        _test_order(self, ["a.build", "b.build", "d.build"], order)
+
+    def test_missing_target(self):
+        configuration = mockconfig.MockConfig({"a": {}})
+
+        def _run_fn():
+            devpipeline_core.resolve._process_reverse(["b"], configuration, ["build"])
+
+        self.assertRaises(devpipeline_core.resolve.MissingComponentsException, _run_fn)
+
+    def test_unrelated_missing_component(self):
+        configuration = mockconfig.MockConfig(
+            {"a": {}, "b": {"depends.build": "a"}, "c": {"depends.build": "z"}}
+        )
+        order = _order_resolve(
+            devpipeline_core.resolve._process_reverse(["a"], configuration, ["build"])
+        )
+        self.assertEqual(["a.build", "b.build"], order)
+
+    def test_circular_deps(self):
+        configuration = mockconfig.MockConfig(
+            {"a": {"depends.build": "b"}, "b": {"depends.build": "a"}, "c": {}}
+        )
+
+        def _run_fn():
+            devpipeline_core.resolve._process_reverse(["a"], configuration, ["build"])
+
+        self.assertRaises(devpipeline_core.resolve.CircularDependencyException, _run_fn)
+
+    def test_unrelated_circular_deps(self):
+        configuration = mockconfig.MockConfig(
+            {"a": {"depends.build": "b"}, "b": {"depends.build": "a"}, "c": {}}
+        )
+        order = _order_resolve(
+            devpipeline_core.resolve._process_reverse(["c"], configuration, ["build"])
+        )
+        self.assertEqual(["c.build"], order)
+
 
 if __name__ == "__main__":
     unittest.main()
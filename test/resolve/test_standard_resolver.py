@@ -117,7 +117,7 @@ class TestStandardResolver(unittest.TestCase):
         self.assertRaises(devpipeline_core.resolve.MissingComponentsException, _run_fn)
 
     def test_circular_deps(self):
-        configuration = mockconfig.MockConfig({"b": {"depends": "b"}})
+        configuration = mockconfig.MockConfig({"b": {"depends.build": "b"}})
 
         def _run_fn():
             devpipeline_core.resolve.calculate_dependencies(
@@ -126,6 +126,36 @@ class TestStandardResolver(unittest.TestCase):
 
         self.assertRaises(devpipeline_core.resolve.CircularDependencyException, _run_fn)
 
+    def test_long_chain(self):
+        chain_length = 5000
+        components = {"c0": {}}
+        for index in range(1, chain_length):
+            components["c{}".format(index)] = {"depends.build": "c{}".format(index - 1)}
+        configuration = mockconfig.MockConfig(components)
+        dm = devpipeline_core.resolve.calculate_dependencies(
+            ["c{}".format(chain_length - 1)], configuration, ["build"]
+        )
+        self.assertEqual(chain_length, len(dm.get_tasks()))
+
+    def test_circular_chain(self):
+        configuration = mockconfig.MockConfig(
+            {
+                "a": {"depends.build": "c"},
+                "b": {"depends.build": "a"},
+                "c": {"depends.build": "b"},
+                "d": {"depends.build": "c"},
+            }
+        )
+
+        try:
+            devpipeline_core.resolve.calculate_dependencies(
+                ["d"], configuration, ["checkout", "build"]
+            )
+            self.fail("Circular dependency not detected")
+        except devpipeline_core.resolve.CircularDependencyException as failure:
+            expected_cycle = [("a", "build"), ("b", "build"), ("c", "build")]
+            self.assertEqual([expected_cycle], failure.components)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -6,6 +6,8 @@ import devpipeline_core.taskqueue
 
 
 class TestDependencyManager(unittest.TestCase):
+    _MANAGER = devpipeline_core.taskqueue.DependencyManager
+
     def _resolve_tasks(self, task_queue):
         resolved_tasks = []
         for resolved in task_queue:
@@ -22,7 +24,7 @@ class TestDependencyManager(unittest.TestCase):
     def test_no_deps(self):
         components = ["foo", "bar"]
         tasks = ["checkout"]
-        dm = devpipeline_core.taskqueue.DependencyManager(tasks)
+        dm = self._MANAGER(tasks)
         dm.add_dependency((components[0], tasks[0]), None)
         dm.add_dependency((components[1], tasks[0]), None)
         resolved_tasks = self._resolve_helper(dm, components)
@@ -32,7 +34,7 @@ class TestDependencyManager(unittest.TestCase):
     def test_implicit_deps(self):
         components = ["foo"]
         tasks = ["checkout", "build", "test", "install"]
-        dm = devpipeline_core.taskqueue.DependencyManager(tasks)
+        dm = self._MANAGER(tasks)
         dm.add_dependency((components[0], tasks[3]), None)
         resolved_tasks = self._resolve_helper(dm, components)
         expected_tasks = [
@@ -46,7 +48,7 @@ class TestDependencyManager(unittest.TestCase):
     def test_partial_implicit_deps(self):
         components = ["foo"]
         tasks = ["checkout", "build", "test", "install"]
-        dm = devpipeline_core.taskqueue.DependencyManager(tasks)
+        dm = self._MANAGER(tasks)
         dm.add_dependency((components[0], tasks[1]), None)
         resolved_tasks = self._resolve_helper(dm, components)
         expected_tasks = [("foo", "checkout"), ("foo", "build")]
@@ -55,7 +57,7 @@ class TestDependencyManager(unittest.TestCase):
     def test_explicit_deps(self):
         components = ["foo", "bar"]
         tasks = ["build"]
-        dm = devpipeline_core.taskqueue.DependencyManager(tasks)
+        dm = self._MANAGER(tasks)
         dm.add_dependency(("bar", "build"), ("foo", "build"))
         resolved_tasks = self._resolve_helper(dm, components)
         expected_tasks = [("foo", "build"), ("bar", "build")]
@@ -64,7 +66,7 @@ class TestDependencyManager(unittest.TestCase):
     def test_fail(self):
         components = ["foo"]
         tasks = ["checkout", "build", "install"]
-        dm = devpipeline_core.taskqueue.DependencyManager(tasks)
+        dm = self._MANAGER(tasks)
         dm.add_dependency(("foo", "install"), None)
         task_queue = dm.get_queue()
         skipped_tasks = sorted(task_queue.fail(("foo", "checkout")))
@@ -74,7 +76,7 @@ class TestDependencyManager(unittest.TestCase):
     def test_fail_some(self):
         components = ["foo", "bar"]
         tasks = ["checkout", "build"]
-        dm = devpipeline_core.taskqueue.DependencyManager(tasks)
+        dm = self._MANAGER(tasks)
         dm.add_dependency(("foo", "build"), None)
         dm.add_dependency(("bar", "build"), None)
         dm.add_dependency(("bar", "build"), ("foo", "build"))
@@ -86,6 +88,144 @@ class TestDependencyManager(unittest.TestCase):
         self.assertEqual(resolved_tasks, expected_complete)
         self.assertEqual(skipped_tasks, expected_skipped)
 
+    def test_fail_diamonds(self):
+        tasks = ["build"]
+        dm = self._MANAGER(tasks)
+        for layer in range(1, 50):
+            join_task = ("join{}".format(layer), "build")
+            for side in ["left", "right"]:
+                side_task = ("{}{}".format(side, layer), "build")
+                dm.add_dependency(side_task, ("join{}".format(layer - 1), "build"))
+                dm.add_dependency(join_task, side_task)
+        task_queue = dm.get_queue()
+        skipped_tasks = task_queue.fail(("join0", "build"))
+        self.assertEqual(len(skipped_tasks), len(set(skipped_tasks)))
+        self.assertEqual(49 * 3, len(skipped_tasks))
+        self.assertEqual(0, len(task_queue))
+
+    def test_fail_long_chain(self):
+        tasks = ["build"]
+        dm = self._MANAGER(tasks)
+        chain_length = 5000
+        for index in range(1, chain_length):
+            dm.add_dependency((str(index), "build"), (str(index - 1), "build"))
+        task_queue = dm.get_queue()
+        skipped_tasks = task_queue.fail(("0", "build"))
+        self.assertEqual(chain_length - 1, len(skipped_tasks))
+
+    def test_ready_once(self):
+        tasks = ["checkout", "build"]
+        dm = self._MANAGER(tasks)
+        dm.add_dependency(("foo", "build"), None)
+        dm.add_dependency(("bar", "build"), ("foo", "build"))
+        task_queue = dm.get_queue()
+        self.assertEqual(("foo", "checkout"), task_queue.pop_ready())
+        self.assertEqual(("bar", "checkout"), task_queue.pop_ready())
+        self.assertEqual(None, task_queue.pop_ready())
+        task_queue.resolve(("bar", "checkout"))
+        self.assertEqual(None, task_queue.pop_ready())
+        task_queue.resolve(("foo", "checkout"))
+        self.assertEqual(("foo", "build"), task_queue.pop_ready())
+        task_queue.resolve(("foo", "build"))
+        self.assertEqual(("bar", "build"), task_queue.pop_ready())
+        task_queue.resolve(("bar", "build"))
+        self.assertEqual(0, len(task_queue))
+
+    def test_pop_accepted(self):
+        tasks = ["checkout", "build"]
+        dm = self._MANAGER(tasks)
+        dm.add_dependency(("foo", "build"), None)
+        dm.add_dependency(("bar", "build"), None)
+        task_queue = dm.get_queue()
+        self.assertEqual(
+            ("bar", "checkout"),
+            task_queue.pop_ready(lambda task: task[0] == "bar"),
+        )
+        self.assertEqual(None, task_queue.pop_ready(lambda task: False))
+        self.assertEqual(("foo", "checkout"), task_queue.pop_ready())
+
+    def test_pop_open(self):
+        tasks = ["checkout", "build"]
+        dm = self._MANAGER(tasks)
+        dm.add_dependency(("foo", "build"), None)
+        dm.add_dependency(("bar", "build"), None)
+        task_queue = dm.get_queue()
+        checked = []
+
+        def _accept(task):
+            checked.append(task)
+            return True
+
+        self.assertEqual(None, task_queue.pop_ready(_accept, lambda name: False))
+        self.assertEqual([], checked)
+        self.assertEqual(
+            ("foo", "checkout"),
+            task_queue.pop_ready(_accept, lambda name: name == "checkout"),
+        )
+        task_queue.resolve(("foo", "checkout"))
+        self.assertEqual(
+            ("foo", "build"),
+            task_queue.pop_ready(is_open=lambda name: name == "build"),
+        )
+        self.assertEqual(("bar", "checkout"), task_queue.pop_ready())
+
+    def test_queue_leaves_manager_intact(self):
+        tasks = ["build"]
+        dm = self._MANAGER(tasks)
+        dm.add_dependency(("bar", "build"), ("foo", "build"))
+        dm.get_queue().fail(("foo", "build"))
+        skipped_tasks = dm.get_queue().fail(("foo", "build"))
+        self.assertEqual([("bar", "build")], skipped_tasks)
+        dependencies = list(dm.get_dependencies(("bar", "build")))
+        self.assertEqual([("foo", "build")], dependencies)
+
+    def test_priority(self):
+        tasks = ["build"]
+        dm = self._MANAGER(tasks)
+        for component in ["foo", "bar", "baz"]:
+            dm.add_dependency((component, "build"), None)
+        priorities = {"foo": 1, "bar": 3, "baz": 2}
+        task_queue = dm.get_queue(lambda task: priorities[task[0]])
+        resolved_tasks = self._resolve_tasks(task_queue)
+        expected_tasks = [("bar", "build"), ("baz", "build"), ("foo", "build")]
+        self.assertEqual(resolved_tasks, expected_tasks)
+
+    def test_critical_paths(self):
+        tasks = ["checkout", "build"]
+        dm = self._MANAGER(tasks)
+        dm.add_dependency(("foo", "build"), None)
+        dm.add_dependency(("bar", "build"), ("foo", "build"))
+        weights = {"checkout": 1, "build": 10}
+        path_weights = dm.get_critical_paths(lambda task: weights[task[1]])
+        expected_weights = {
+            ("foo", "checkout"): 21,
+            ("foo", "build"): 20,
+            ("bar", "checkout"): 11,
+            ("bar", "build"): 10,
+        }
+        self.assertEqual(path_weights, expected_weights)
+
+    def test_duplicate_deps(self):
+        tasks = ["checkout", "build"]
+        dm = self._MANAGER(tasks)
+        dm.add_dependency(("bar", "build"), ("foo", "build"))
+        dm.add_dependency(("bar", "build"), ("foo", "build"))
+        dm.add_dependency(("bar", "build"), ("bar", "checkout"))
+        dependencies = sorted(dm.get_dependencies(("bar", "build")))
+        self.assertEqual([("bar", "checkout"), ("foo", "build")], dependencies)
+        reverse_dependencies = sorted(dm.get_reverse_dependencies(("foo", "build")))
+        self.assertEqual([("bar", "build")], reverse_dependencies)
+
+
+class TestCompactDependencyManager(TestDependencyManager):
+    _MANAGER = devpipeline_core.taskqueue.CompactDependencyManager
+
+    def test_missing_task(self):
+        dm = self._MANAGER(["checkout", "build"])
+        dm.add_dependency(("foo", "checkout"), None)
+        self.assertRaises(KeyError, dm.get_dependencies, ("foo", "build"))
+        self.assertRaises(KeyError, dm.get_dependencies, ("bar", "checkout"))
+
 
 if __name__ == "__main__":
     unittest.main()
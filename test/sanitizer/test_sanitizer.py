@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+import devpipeline_core.sanitizer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))
+
+import mockconfig
+
+_CONFIG = mockconfig.MockConfig(
+    {
+        "a": {"depends.build": "b, ", "prefix": "${b:install_path}"},
+        "b": {"depends": "c", "prefix": "${c:install_path}"},
+        "c": {"depends.build": "", "prefix": "/usr"},
+    }
+)
+
+_EXPECTED = [
+    ("empty-depends", "Empty dependency in a:depends.build"),
+    ("implicit-depends", "b:prefix has an implicit dependency on c"),
+    ("legacy-depends", "b uses a deprecated key (depends)"),
+]
+
+
+def _whole_config_sanitizer(configuration, error_fn):
+    error_fn("{} components".format(len(configuration.keys())))
+
+
+_SANITIZERS = {
+    "empty-depends": devpipeline_core.sanitizer._sanitize_empty_depends,
+    "implicit-depends": devpipeline_core.sanitizer._sanitize_implicit_depends,
+    "legacy-depends": devpipeline_core.sanitizer._sanitize_legacy_depends,
+}
+
+
+class TestSanitize(unittest.TestCase):
+    def _sanitize(self, sanitizers, jobs=1):
+        warnings = []
+        with unittest.mock.patch.object(
+            devpipeline_core.sanitizer, "_SANITIZERS", sanitizers
+        ):
+            devpipeline_core.sanitizer.sanitize(
+                _CONFIG, lambda name, warning: warnings.append((name, warning)), jobs
+            )
+        return warnings
+
+    def test_single_pass(self):
+        self.assertEqual(_EXPECTED, self._sanitize(_SANITIZERS))
+
+    def test_matches_direct_calls(self):
+        warnings = []
+        for name, sanitize_fn in _SANITIZERS.items():
+            sanitize_fn(_CONFIG, lambda warning, n=name: warnings.append((n, warning)))
+        self.assertEqual(_EXPECTED, warnings)
+
+    def test_whole_config_sanitizer(self):
+        sanitizers = dict(_SANITIZERS)
+        sanitizers["count"] = _whole_config_sanitizer
+        self.assertEqual(
+            _EXPECTED + [("count", "3 components")], self._sanitize(sanitizers)
+        )
+
+    def test_process_pool(self):
+        self.assertEqual(_EXPECTED, self._sanitize(_SANITIZERS, jobs=2))
+
+
+class TestIncrementalSanitize(unittest.TestCase):
+    def setUp(self):
+        self._config_dir = tempfile.TemporaryDirectory()
+        self._components = {
+            "a": {"dp.config_dir": self._config_dir.name, "depends.build": "b"},
+            "b": {"dp.config_dir": self._config_dir.name, "depends.build": ""},
+            "c": {"dp.config_dir": self._config_dir.name, "depends.build": "a, "},
+        }
+        self._checked = []
+
+    def tearDown(self):
+        self._config_dir.cleanup()
+
+    def _check(self, index, error_fn):
+        self._checked.append(index.name)
+        devpipeline_core.sanitizer._check_empty_depends(index, error_fn)
+
+    def _sanitize(self):
+        warnings = []
+        self._checked = []
+        sanitizers = {
+            "empty-depends": devpipeline_core.sanitizer.per_component(self._check)
+        }
+        with unittest.mock.patch.object(
+            devpipeline_core.sanitizer, "_SANITIZERS", sanitizers
+        ):
+            devpipeline_core.sanitizer.sanitize(
+                mockconfig.MockConfig(self._components),
+                lambda name, warning: warnings.append((name, warning)),
+                incremental=True,
+            )
+        return warnings
+
+    def test_unchanged(self):
+        expected = [("empty-depends", "Empty dependency in c:depends.build")]
+        self.assertEqual(expected, self._sanitize())
+        self.assertEqual(["a", "b", "c"], self._checked)
+        self.assertEqual(expected, self._sanitize())
+        self.assertEqual([], self._checked)
+
+    def test_changed_dependency(self):
+        self._sanitize()
+        self._components["b"]["depends.build"] = "c"
+        self._sanitize()
+        self.assertEqual(["a", "b"], self._checked)
+
+
+if __name__ == "__main__":
+    unittest.main()
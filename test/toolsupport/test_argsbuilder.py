@@ -5,6 +5,7 @@ import sys
 import unittest
 
 import devpipeline_core.configinfo
+import devpipeline_core.executor
 import devpipeline_core.toolsupport
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))